@@ -0,0 +1,238 @@
+"""
+Equivalent-source gridding of scattered TMI data.
+
+A layer of dipoles, magnetized along the inducing field, is fitted to the observed
+TMI, then used to predict the TMI on a target grid. Large sensitivity matrices are
+never formed: their rows are computed block by block with the dipole kernel for each
+product, so memory is bounded by the block size whatever the number of
+observations. Small ones are kept in memory for the iterations of the solver.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+from mag_dipole_app import inclination_declination_2_xyz
+
+if TYPE_CHECKING:
+    from geoh5py.data import Data
+    from geoh5py.objects import ObjectBase
+
+
+def source_layer(locations: np.ndarray, spacing: float, depth: float) -> np.ndarray:
+    """
+    Place equivalent sources below the observations, one per horizontal cell of a
+    regular mesh containing observations.
+
+    :param locations: Array of observation locations, shape(n, 3).
+    :param spacing: Horizontal size of the cells.
+    :param depth: Depth of the sources below the mean elevation of the observations
+        in each cell.
+
+    :return: Array of source locations, shape(m, 3), at the mean location of the
+        observations in each cell.
+    """
+    cells = np.floor((locations[:, :2] - locations[:, :2].min(axis=0)) / spacing)
+    _, inverse, counts = np.unique(
+        cells, axis=0, return_inverse=True, return_counts=True
+    )
+    inverse = inverse.ravel()
+
+    sources = np.column_stack(
+        [np.bincount(inverse, weights=locations[:, i]) / counts for i in range(3)]
+    )
+    sources[:, 2] -= depth
+
+    return sources
+
+
+class EquivalentSources:
+    """
+    Layer of induced dipoles and its TMI response.
+
+    :param sources: Array of source locations, shape(m, 3).
+    :param earth_inc: Inclination angle of the inducing field.
+    :param earth_dec: Declination angle of the inducing field.
+    :param block_size: Maximum number of kernel values computed at once.
+    :param cache_size: Maximum number of kernel values kept in memory by fit, to
+        avoid re-computing them at each iteration. Above, blocks are re-computed.
+    """
+
+    def __init__(
+        self,
+        sources: np.ndarray,
+        earth_inc: float,
+        earth_dec: float,
+        block_size: int = 2**22,
+        cache_size: int = 2**26,
+    ):
+        self.sources = np.asarray(sources, dtype=float)
+        self.direction = inclination_declination_2_xyz(earth_inc, earth_dec)[0]
+        self.block_size = block_size
+        self.cache_size = cache_size
+        self.moments = np.zeros(self.sources.shape[0])
+
+    def blocks(self, locations: np.ndarray):
+        """
+        Yield slices of locations and the corresponding rows of the kernel.
+
+        Each row holds the TMI at one location of unit moments for all the sources.
+        """
+        # mu_0 / 4 pi  * 1e9 for nT, as for b_field
+        constant = 100
+        size = max(1, self.block_size // self.sources.shape[0])
+
+        for start in range(0, locations.shape[0], size):
+            rows = slice(start, start + size)
+            rad = self.sources[None, :, :] - locations[rows, None, :]
+            dist_sq = np.einsum("ijk,ijk->ij", rad, rad)
+            projection = rad @ self.direction
+
+            # Source moments and TMI projection share the inducing field direction
+            kernel = constant * (3 * projection**2 / dist_sq - 1) / dist_sq**1.5
+
+            yield rows, kernel
+
+    def forward(self, locations: np.ndarray, moments: np.ndarray) -> np.ndarray:
+        """
+        TMI of the sources at locations.
+
+        :param locations: Array of observation locations, shape(n, 3).
+        :param moments: Dipole moments of the sources, shape(m,).
+
+        :return: Array of TMI values, shape(n,).
+        """
+        return self._forward(self.blocks(locations), moments, locations.shape[0])
+
+    def adjoint(self, locations: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        Product of the transposed kernel with values at locations.
+
+        :param locations: Array of observation locations, shape(n, 3).
+        :param values: Array of values, shape(n,).
+
+        :return: Array of values on the sources, shape(m,).
+        """
+        return self._adjoint(self.blocks(locations), values)
+
+    def fit(
+        self,
+        locations: np.ndarray,
+        tmi: np.ndarray,
+        damping: float = 0.0,
+        max_iterations: int = 100,
+        tolerance: float = 1e-4,
+    ) -> int:
+        """
+        Fit the moments of the sources to observed TMI, solving the damped least
+        squares problem with conjugate gradients (CGLS).
+
+        :param locations: Array of observation locations, shape(n, 3).
+        :param tmi: Observed TMI values, shape(n,).
+        :param damping: Weight of the squared norm of the moments.
+        :param max_iterations: Maximum number of iterations.
+        :param tolerance: Stop once the norm of the gradient decreased by this factor.
+
+        :return: Number of iterations.
+        """
+        size = locations.shape[0]
+        cached = None
+        if size * self.sources.shape[0] <= self.cache_size:
+            cached = list(self.blocks(locations))
+
+        def blocks():
+            return cached if cached is not None else self.blocks(locations)
+
+        moments = np.zeros(self.sources.shape[0])
+        residual = np.asarray(tmi, dtype=float).ravel().copy()
+        gradient = self._adjoint(blocks(), residual)
+        direction = gradient.copy()
+        norm = initial = gradient @ gradient
+
+        iteration = 0
+        while iteration < max_iterations and norm > tolerance**2 * initial:
+            iteration += 1
+            product = self._forward(blocks(), direction, size)
+            step = norm / (product @ product + damping * direction @ direction)
+            moments += step * direction
+            residual -= step * product
+            gradient = self._adjoint(blocks(), residual) - damping * moments
+
+            norm, previous = gradient @ gradient, norm
+            direction = gradient + norm / previous * direction
+
+        self.moments = moments
+
+        return iteration
+
+    def predict(self, locations: np.ndarray) -> np.ndarray:
+        """TMI of the fitted sources at locations, shape(n,)."""
+        return self.forward(locations, self.moments)
+
+    @staticmethod
+    def _forward(blocks, moments: np.ndarray, size: int) -> np.ndarray:
+        values = np.empty(size)
+        for rows, kernel in blocks:
+            values[rows] = kernel @ moments
+
+        return values
+
+    def _adjoint(self, blocks, values: np.ndarray) -> np.ndarray:
+        result = np.zeros(self.sources.shape[0])
+        for rows, kernel in blocks:
+            result += values[rows] @ kernel
+
+        return result
+
+
+def grid_tmi(
+    receivers: ObjectBase,
+    tmi: Data,
+    grid: ObjectBase,
+    earth_inc: float,
+    earth_dec: float,
+    spacing: float,
+    depth: float,
+    damping: float = 0.0,
+    max_iterations: int = 100,
+    name: str = "tmi_equivalent_source",
+) -> Data:
+    """
+    Interpolate scattered TMI data on a grid with equivalent sources.
+
+    :param receivers: Points object of observation locations.
+    :param tmi: Data of TMI values on the receivers.
+    :param grid: Grid2D object, or any object with centroids or vertices.
+    :param earth_inc: Earth's field inclination angle.
+    :param earth_dec: Earth's field declination angle.
+    :param spacing: Horizontal spacing of the sources, see source_layer.
+    :param depth: Depth of the sources below the observations.
+    :param damping: Weight of the squared norm of the moments.
+    :param max_iterations: Maximum number of iterations of the solver.
+    :param name: Name of the data added to the grid.
+
+    :return: Data of predicted TMI on the grid.
+    """
+    locations = receivers.vertices
+    values = tmi.values
+    active = ~np.isnan(values)
+
+    model = EquivalentSources(
+        source_layer(locations[active], spacing, depth), earth_inc, earth_dec
+    )
+    model.fit(
+        locations[active],
+        values[active],
+        damping=damping,
+        max_iterations=max_iterations,
+    )
+
+    targets = getattr(grid, "centroids", None)
+    if targets is None:
+        targets = grid.vertices
+
+    return grid.add_data({name: {"values": model.predict(targets)}})
+
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
@@ -0,0 +1,117 @@
+"""
+Fast rendering of data on Grid2D objects, decimated to the resolution of the figure.
+"""
+
+from __future__ import annotations
+
+import warnings
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from geoh5py.data import Data
+    from geoh5py.objects import Grid2D
+
+
+def grid_values(grid: Grid2D, values: Data | np.ndarray) -> np.ndarray:
+    """
+    Reshape the values of a grid to a 2D array of shape (v_count, u_count).
+
+    Cells are ordered along u first, as for the grid centroids.
+    """
+    values = getattr(values, "values", values)
+    return np.asarray(values, dtype=float).reshape(grid.v_count, grid.u_count)
+
+
+def block_reduce(array: np.ndarray, factor: int, method: str = "mean") -> np.ndarray:
+    """
+    Reduce the resolution of a 2D array by an integer factor.
+
+    :param array: 2D array of values.
+    :param factor: Number of cells merged along each axis.
+    :param method: 'mean' to average blocks of cells, ignoring nan values, or
+        'decimate' to keep one cell out of factor.
+
+    :return: Array of shape ceil(array.shape / factor).
+    """
+    if factor <= 1:
+        return array
+
+    if method == "decimate":
+        return array[::factor, ::factor]
+
+    if method != "mean":
+        raise ValueError("Method should be one of 'mean' or 'decimate'.")
+
+    n_v, n_u = -(-array.shape[0] // factor), -(-array.shape[1] // factor)
+    padded = np.full((n_v * factor, n_u * factor), np.nan)
+    padded[: array.shape[0], : array.shape[1]] = array
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        return np.nanmean(padded.reshape(n_v, factor, n_u, factor), axis=(1, 3))
+
+
+def plot_grid(
+    grid: Grid2D,
+    values: Data | np.ndarray,
+    axis=None,
+    method: str = "mean",
+    **kwargs,
+):
+    """
+    Plot values of a horizontal Grid2D as an image, at the resolution of the axis.
+
+    The grid is reduced by the smallest factor giving no more cells than pixels of
+    the axis, then drawn with ``imshow`` over the extent of the grid, rotated about
+    its origin. The limits of the axis are set to the extent of the grid.
+
+    :param grid: Horizontal Grid2D object.
+    :param values: Data or array of values on the grid cells.
+    :param axis: Matplotlib axis to plot on. A new figure is created if None.
+    :param method: Reduction method, 'mean' or 'decimate' (see block_reduce).
+    :param kwargs: Extra arguments passed to ``imshow``, such as 'cmap'.
+
+    :return: The AxesImage.
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.transforms import Affine2D
+
+    if axis is None:
+        _, axis = plt.subplots()
+
+    array = grid_values(grid, values)
+    pixels = axis.get_window_extent()
+    factor = int(
+        max(np.ceil(grid.u_count / pixels.width), np.ceil(grid.v_count / pixels.height))
+    )
+
+    x_0, y_0 = grid.origin["x"], grid.origin["y"]
+    width, height = grid.u_count * grid.u_cell_size, grid.v_count * grid.v_cell_size
+    rotation = Affine2D().rotate_deg_around(x_0, y_0, float(np.r_[grid.rotation][0]))
+    image = axis.imshow(
+        block_reduce(array, factor, method),
+        origin="lower",
+        extent=(x_0, x_0 + width, y_0, y_0 + height),
+        interpolation="nearest",
+        transform=rotation + axis.transData,
+        **kwargs,
+    )
+
+    corners = rotation.transform(
+        [
+            [x_0, y_0],
+            [x_0 + width, y_0],
+            [x_0 + width, y_0 + height],
+            [x_0, y_0 + height],
+        ]
+    )
+    axis.set_xlim(corners[:, 0].min(), corners[:, 0].max())
+    axis.set_ylim(corners[:, 1].min(), corners[:, 1].max())
+    axis.set_aspect("equal")
+
+    return image
+
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
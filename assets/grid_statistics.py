@@ -0,0 +1,236 @@
+"""
+Out-of-core statistics and anomaly picking on geoh5 data.
+
+Values are read from the geoh5 file in chunks and summarized in a single pass with
+mergeable statistics, so arrays larger than memory, such as TMI on large grids, never
+need to be loaded at once.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterator
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from geoh5py.data import Data
+
+
+class StreamingStatistics:
+    """
+    Single-pass, mergeable summary of values: count, extremes, mean and variance
+    (Welford/Chan updates) and an adaptive histogram for the percentiles.
+
+    The histogram has a fixed number of bins of equal width. Its range grows by
+    doubling the width of the bins, merging them in pairs, whenever new values fall
+    outside. Percentiles are interpolated within bins, with an error smaller than
+    the final bin width.
+
+    :param bins: Number of bins of the histogram, even.
+    """
+
+    def __init__(self, bins: int = 4096):
+        if bins % 2:
+            raise ValueError("The number of bins must be even.")
+
+        self.count = 0
+        self.mean = 0.0
+        self.sum_squares = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.origin: float | None = None
+        self.width = 0.0
+
+    @property
+    def variance(self) -> float:
+        """Population variance of the values."""
+        return self.sum_squares / self.count if self.count else np.nan
+
+    @property
+    def std(self) -> float:
+        """Population standard deviation of the values."""
+        return self.variance**0.5
+
+    def update(self, values: np.ndarray) -> StreamingStatistics:
+        """
+        Add values to the summary. Nan values are ignored.
+
+        :param values: Array of values.
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+
+        if values.size == 0:
+            return self
+
+        self._combine(values.size, values.mean(), ((values - values.mean()) ** 2).sum())
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+        self._cover(values.min(), values.max())
+        indices = np.minimum(
+            ((values - self.origin) / self.width).astype(np.int64),
+            len(self.counts) - 1,
+        )
+        self.counts += np.bincount(indices, minlength=len(self.counts))
+
+        return self
+
+    def merge(self, other: StreamingStatistics) -> StreamingStatistics:
+        """
+        Merge the summary of other values, for example computed in parallel.
+
+        Counts of the other histogram are assigned to the bins of this one by the
+        center of their bin.
+
+        :param other: Summary of other values.
+        """
+        if other.count == 0:
+            return self
+
+        self._combine(other.count, other.mean, other.sum_squares)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+        self._cover(other.min, other.max)
+        centers = other.origin + (np.arange(len(other.counts)) + 0.5) * other.width
+        indices = np.clip(
+            ((centers - self.origin) / self.width).astype(np.int64),
+            0,
+            len(self.counts) - 1,
+        )
+        self.counts += np.bincount(
+            indices, weights=other.counts, minlength=len(self.counts)
+        ).astype(np.int64)
+
+        return self
+
+    def percentile(self, q: float | np.ndarray) -> float | np.ndarray:
+        """
+        Approximate percentiles of the values.
+
+        :param q: Percentile(s), between 0 and 100.
+        """
+        if self.count == 0:
+            return np.full_like(np.asarray(q, dtype=float), np.nan)
+
+        edges = self.origin + np.arange(len(self.counts) + 1) * self.width
+        cumulative = np.r_[0, np.cumsum(self.counts)] / self.count
+        values = np.interp(np.asarray(q) / 100.0, cumulative, edges)
+
+        return np.clip(values, self.min, self.max)
+
+    def summary(self, percentiles=(1, 5, 25, 50, 75, 95, 99)) -> dict:
+        """Dictionary of the statistics."""
+        return {
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.mean,
+            "std": self.std,
+            **{
+                f"p{q}": value
+                for q, value in zip(percentiles, self.percentile(np.r_[percentiles]))
+            },
+        }
+
+    def _combine(self, count: int, mean: float, sum_squares: float):
+        """Chan et al. update of the mean and sum of squared deviations."""
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.sum_squares += sum_squares + delta**2 * self.count * count / total
+        self.count = total
+
+    def _cover(self, low: float, high: float):
+        """Grow the range of the histogram to include [low, high]."""
+        bins = len(self.counts)
+        if self.origin is None:
+            self.origin = low
+            self.width = (high - low) / bins or 1.0
+            # Upper bound exclusive
+            while self.origin + bins * self.width <= high:
+                self.width *= 2.0
+            return
+
+        while low < self.origin or high >= self.origin + bins * self.width:
+            merged = self.counts.reshape(-1, 2).sum(axis=1)
+            self.counts[:] = 0
+            if low < self.origin:
+                # Extend down, existing bins move to the upper half
+                self.counts[bins // 2 :] = merged
+                self.origin -= bins * self.width
+            else:
+                self.counts[: bins // 2] = merged
+            self.width *= 2.0
+
+
+def data_chunks(
+    data: Data, chunk_size: int = 2**20
+) -> Iterator[tuple[int, np.ndarray]]:
+    """
+    Read the values of a Data from its geoh5 file, chunk by chunk.
+
+    The open handle of the workspace is used if available, otherwise the file is
+    opened in read mode. No-data values are converted to nan.
+
+    :param data: Data with float or integer values.
+    :param chunk_size: Number of values per chunk.
+
+    :return: Generator of the index of the first value and the values of each chunk.
+    """
+    from geoh5py.shared import fetch_h5_handle
+    from geoh5py.shared.exceptions import Geoh5FileClosedError
+
+    try:
+        h5file = data.workspace.geoh5
+    except Geoh5FileClosedError:
+        h5file = data.workspace.h5file
+
+    with fetch_h5_handle(h5file) as file:
+        name = list(file)[0]
+        dataset = file[name]["Data"]["{" + str(data.uid) + "}"]["Data"]
+        no_data = dataset.dtype.type(data.ndv)
+
+        for start in range(0, dataset.shape[0], chunk_size):
+            chunk = dataset[start : start + chunk_size]
+            values = chunk.astype(float)
+            values[chunk == no_data] = np.nan
+            yield start, values
+
+
+def data_statistics(
+    data: Data, chunk_size: int = 2**20, bins: int = 4096
+) -> StreamingStatistics:
+    """
+    Compute the statistics of a Data in a single pass over chunks.
+
+    :param data: Data with float or integer values.
+    :param chunk_size: Number of values per chunk.
+    :param bins: Number of bins of the histogram.
+    """
+    statistics = StreamingStatistics(bins=bins)
+    for _, values in data_chunks(data, chunk_size):
+        statistics.update(values)
+
+    return statistics
+
+
+def anomalous_cells(
+    data: Data, threshold: float, chunk_size: int = 2**20
+) -> Iterator[np.ndarray]:
+    """
+    Find the cells with values above a threshold, block by block.
+
+    :param data: Data with float or integer values.
+    :param threshold: Cutoff value for anomalous cells.
+    :param chunk_size: Number of values per chunk.
+
+    :return: Generator of the indices of anomalous cells in each chunk.
+    """
+    for start, values in data_chunks(data, chunk_size):
+        yield start + np.flatnonzero(values > threshold)
+
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
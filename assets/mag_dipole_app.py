@@ -2,16 +2,33 @@
 
 from __future__ import annotations
 
+import os
 import sys
-
-import numpy as np
-from geoh5py.data import Data
-from geoh5py.objects import ObjectBase
-from geoh5py.ui_json import InputFile
-from geoh5py.ui_json.utils import monitored_directory_copy
+from importlib.util import find_spec
+from typing import TYPE_CHECKING
+
+# Heavy modules (numpy, geoh5py) are imported where needed to keep the start-up of
+# the script, launched in a new process by ANALYST on every run, to a minimum.
+if TYPE_CHECKING:
+    from profiling import Profiler
+
+    from geoh5py.data import Data
+    from geoh5py.objects import ObjectBase
+    from ui_json_cache import InputFileCache
+
+# Backend of the fused field kernel: numexpr if installed, otherwise in-place numpy
+# operations. Set MAG_DIPOLE_KERNEL to 'numpy' to force the latter.
+KERNEL_BACKEND = os.environ.get(
+    "MAG_DIPOLE_KERNEL", "numexpr" if find_spec("numexpr") is not None else "numpy"
+)
+if KERNEL_BACKEND not in ("numexpr", "numpy"):
+    raise ValueError(
+        f"MAG_DIPOLE_KERNEL should be one of 'numexpr' or 'numpy', "
+        f"not '{KERNEL_BACKEND}'."
+    )
 
 
-def b_field(source, locations, moment, inclination, declination):
+def b_field(source, locations, moment, inclination, declination, gradient=False):
     """
     Compute the magnetic field components of a dipole on an array of locations.
 
@@ -20,12 +37,19 @@ def b_field(source, locations, moment, inclination, declination):
     :param moment: Dipole moment of the source (A.m^2)
     :param inclination: Dipole horizontal angle, clockwise from North
     :param declination: Dipole vertical angle from horizontal, positive down
+    :param gradient: Also return the gradient tensor, computed in the same pass.
 
-    :return: Array of magnetic field components, shape(n, 3)
+    :return: Array of magnetic field components, shape(n, 3), and if requested the
+        array of symmetric gradient tensors (nT/m), shape(n, 3, 3).
     """
+    import numpy as np
+
     # Convert the inclination and declination to Cartesian vector
     m = moment * inclination_declination_2_xyz(inclination, declination)
 
+    if not gradient:
+        return dipole_fields(np.reshape(source, (1, 3)), locations, m)
+
     # Compute the radial components
     rad = source - locations
 
@@ -34,15 +58,231 @@ def b_field(source, locations, moment, inclination, declination):
 
     # mu_0 / 4 pi  * 1e9 for nT
     constant = 100
-    fields = constant * (
-        ((np.dot(m, rad.T).T * 3 * rad) / dist[:, None] ** 5) - (m / dist[:, None] ** 3)
+    m_dot_r = np.dot(m, rad.T).T
+    dist_5 = dist[:, None] ** 5
+    fields = constant * (((m_dot_r * 3 * rad) / dist_5) - (m / dist[:, None] ** 3))
+
+    # Derivatives with respect to the locations, re-using the terms of the field
+    m_dot_r = m_dot_r[:, :, None]
+    outer = rad[:, :, None] * m[:, None, :]
+    r_r = rad[:, :, None] * rad[:, None, :] / dist[:, None, None] ** 2
+    tensor = (-constant / dist_5[:, :, None]) * (
+        3 * (outer + outer.transpose(0, 2, 1) + m_dot_r * np.eye(3))
+        - 15 * m_dot_r * r_r
     )
 
+    return fields, tensor
+
+
+def dipole_fields(sources, locations, moments, gradient=False, block_size=2**20):
+    """
+    Compute the total magnetic field of many dipoles on an array of locations.
+
+    Dipoles are processed in blocks, with the same terms as b_field computed for all
+    pairs of sources and locations of a block at once.
+
+    :param sources: Array of dipole locations, shape(m, 3).
+    :param locations: Array of observation locations, shape(n, 3).
+    :param moments: Array of dipole moment vectors (A.m^2), shape(m, 3).
+    :param gradient: Also return the gradient tensor, computed in the same pass.
+    :param block_size: Maximum number of pairs of sources and locations per block.
+
+    :return: Array of magnetic field components, shape(n, 3), and if requested the
+        array of symmetric gradient tensors (nT/m), shape(n, 3, 3).
+    """
+    import numpy as np
+
+    # mu_0 / 4 pi  * 1e9 for nT
+    constant = 100
+    fields = np.zeros((locations.shape[0], 3))
+    tensor = np.zeros((locations.shape[0], 3, 3)) if gradient else None
+    size = max(1, block_size // (locations.shape[0] * (3 if gradient else 1)))
+    size = max(1, min(size, sources.shape[0]))
+
+    # Workspace re-used by all the blocks
+    rad_buffer = np.empty((size, locations.shape[0], 3))
+    dist_buffer = np.empty((size, locations.shape[0], 1))
+    factor_buffer = np.empty((size, locations.shape[0], 1))
+
+    for start in range(0, sources.shape[0], size):
+        count = min(size, sources.shape[0] - start)
+
+        # Radial components, shape(k, n, 3), and moments, shape(k, 1, 3)
+        rad = np.subtract(
+            sources[start : start + count, None, :],
+            locations[None, :, :],
+            out=rad_buffer[:count],
+        )
+        m = moments[start : start + count, None, :]
+
+        if not gradient:
+            fields += constant * FUSED_FIELDS[KERNEL_BACKEND](
+                rad, m, dist_buffer[:count], factor_buffer[:count]
+            )
+            continue
+
+        dist_sq = np.einsum("ijk,ijk->ij", rad, rad)[:, :, None]
+        dist_5 = dist_sq**2.5
+        m_dot_r = np.sum(m * rad, axis=2, keepdims=True)
+        fields += constant * np.sum(
+            3 * m_dot_r * rad / dist_5 - m / dist_sq**1.5, axis=0
+        )
+
+        m_dot_r = m_dot_r[..., None]
+        outer = rad[..., :, None] * m[..., None, :]
+        r_r = rad[..., :, None] * rad[..., None, :] / dist_sq[..., None]
+        tensor -= constant * np.sum(
+            (
+                3 * (outer + outer.swapaxes(-1, -2) + m_dot_r * np.eye(3))
+                - 15 * m_dot_r * r_r
+            )
+            / dist_5[..., None],
+            axis=0,
+        )
+
+    if gradient:
+        return fields, tensor
+
     return fields
 
 
+def fused_fields_numpy(rad, m, dist_sq, factor):
+    """
+    Sum of the fields of a block of dipoles, divided by mu_0 / 4 pi, with in-place
+    operations on workspace buffers.
+
+    The radial components are overwritten.
+
+    :param rad: Radial components, shape(k, n, 3).
+    :param m: Dipole moment vectors, shape(k, 1, 3).
+    :param dist_sq: Buffer for the squared distances, shape(k, n, 1).
+    :param factor: Buffer for the projections of the moments, shape(k, n, 1).
+
+    :return: Array of field components, shape(n, 3).
+    """
+    import numpy as np
+
+    np.einsum("ijk,ijk->ij", rad, rad, out=dist_sq[..., 0])
+
+    # 3 (m . r) / |r|^2
+    np.matmul(rad, m.transpose(0, 2, 1), out=factor)
+    factor *= 3.0
+    factor /= dist_sq
+
+    # (3 (m . r) r / |r|^2 - m) / |r|^3
+    rad *= factor
+    rad -= m
+    np.power(dist_sq, -1.5, out=dist_sq)
+    rad *= dist_sq
+
+    return rad.sum(axis=0)
+
+
+def fused_fields_numexpr(rad, m, dist_sq, factor):
+    """
+    Sum of the fields of a block of dipoles, divided by mu_0 / 4 pi, evaluated by
+    numexpr in a single pass per component.
+
+    See fused_fields_numpy for the parameters.
+    """
+    import numexpr
+    import numpy as np
+
+    variables = {
+        "r_x": rad[..., 0],
+        "r_y": rad[..., 1],
+        "r_z": rad[..., 2],
+        "m_x": m[..., 0],
+        "m_y": m[..., 1],
+        "m_z": m[..., 2],
+    }
+    numexpr.evaluate(
+        "r_x * r_x + r_y * r_y + r_z * r_z", local_dict=variables, out=dist_sq[..., 0]
+    )
+    numexpr.evaluate(
+        "3 * (m_x * r_x + m_y * r_y + m_z * r_z) / d_sq",
+        local_dict={**variables, "d_sq": dist_sq[..., 0]},
+        out=factor[..., 0],
+    )
+    variables.update(d_sq=dist_sq[..., 0], f=factor[..., 0])
+
+    return np.column_stack(
+        [
+            numexpr.evaluate(
+                f"sum((f * r_{axis} - m_{axis}) / (d_sq * sqrt(d_sq)), axis=0)",
+                local_dict=variables,
+            )
+            for axis in "xyz"
+        ]
+    )
+
+
+FUSED_FIELDS = {"numpy": fused_fields_numpy, "numexpr": fused_fields_numexpr}
+
+
+def cell_volumes(entity):
+    """
+    Volumes of the cells of a BlockModel, in the order of its centroids.
+
+    :param entity: BlockModel object.
+
+    :return: Array of volumes, shape(n_cells,).
+    """
+    import numpy as np
+
+    cells = [getattr(entity, f"{axis}_cells", None) for axis in "uvz"]
+    if any(size is None for size in cells):
+        raise ValueError(
+            f"Volumes must be provided for sources of type {type(entity).__name__}."
+        )
+
+    return np.prod(np.meshgrid(*[np.abs(size) for size in cells]), axis=0).ravel()
+
+
+def grid_tiles(grid, tile_size=2**16):
+    """
+    Generate the centroids of a Grid2D tile by tile, from its definition.
+
+    Centroids are ordered as for the centroids of the grid, along u first, without
+    forming the array of all the coordinates.
+
+    :param grid: Grid2D object.
+    :param tile_size: Number of cells per tile.
+
+    :return: Generator of the slice of cells and their centroids, shape(k, 3).
+    """
+    import numpy as np
+
+    angle = np.deg2rad(grid.rotation)
+    rotation = np.r_[
+        np.c_[np.cos(angle), -np.sin(angle), 0],
+        np.c_[np.sin(angle), np.cos(angle), 0],
+        np.c_[0, 0, 1],
+    ]
+    origin = np.r_[grid.origin["x"], grid.origin["y"], grid.origin["z"]]
+
+    for start in range(0, grid.u_count * grid.v_count, tile_size):
+        cells = np.arange(start, min(start + tile_size, grid.u_count * grid.v_count))
+        local = np.zeros((cells.shape[0], 3))
+        local[:, 0] = (cells % grid.u_count + 0.5) * grid.u_cell_size
+        local[:, 2 if grid.vertical else 1] = (
+            cells // grid.u_count + 0.5
+        ) * grid.v_cell_size
+
+        yield slice(start, start + cells.shape[0]), local @ rotation.T + origin
+
+
 def inclination_declination_2_xyz(inclination, declination):
-    """Convert inclination and declination angles (degrees) to unit vector (xyz)."""
+    """
+    Convert inclination and declination angles (degrees) to unit vector (xyz).
+
+    Angles are either values or arrays, broadcast against each other.
+
+    :return: Array of unit vectors, shape(n, 3).
+    """
+    import numpy as np
+
+    inclination, declination = np.broadcast_arrays(inclination, declination)
     theta = np.deg2rad((450 - declination) % 360)
     phi = np.deg2rad(90 + inclination)
     xyz = np.c_[np.sin(phi) * np.cos(theta), np.sin(phi) * np.sin(theta), np.cos(phi)]
@@ -51,9 +291,24 @@ def inclination_declination_2_xyz(inclination, declination):
 
 
 def tmi_projection(b_components, earth_field):
-    """Project magnetic field onto Earth's field."""
+    """
+    Project magnetic field onto Earth's field.
+
+    :param b_components: Array of magnetic field components, shape(n, 3).
+    :param earth_field: Inclination and declination angles of Earth's field, either
+        values or arrays of shape(n,) for a field varying between locations.
+
+    :return: Array of TMI values, shape(1, n).
+    """
+    import numpy as np
+
     h0 = inclination_declination_2_xyz(earth_field[0], earth_field[1])
-    return np.dot(h0, b_components.T)
+
+    if h0.shape[0] == 1:
+        return np.dot(h0, b_components.T)
+
+    # Row-wise dot product with the field at each location
+    return np.einsum("ij,ij->i", h0, b_components)[None, :]
 
 
 def magnetic_simulator(
@@ -62,34 +317,137 @@ def magnetic_simulator(
     moments: Data | float,
     inclinations: Data | float,
     declinations: Data | float,
-    earth_inc: float,
-    earth_dec: float,
+    earth_inc: Data | float,
+    earth_dec: Data | float,
+    profiler: Profiler | None = None,
+    gradients: bool = False,
+    susceptibilities: Data | None = None,
+    volumes: Data | float | None = None,
+    earth_strength: float = 50000.0,
+    geometry: dict | None = None,
+    order: str | None = None,
 ):
     """
     Compute the magnetic field components of dipoles on a geoh5py object.
 
+    The gradient tensor components (b_xx, b_xy, ...) and the amplitude of the
+    analytic signal of the TMI are computed along the field if requested.
+
+    Dipoles can also be magnetized by induction from susceptibility values, in
+    which case moments, inclinations and declinations are ignored. The inducing field
+    at the sources is along the average direction of Earth's field on the receivers.
+
     :param sources: Points object of dipole locations.
     :param receivers: Array or Points object of observation locations.
     :param moments: Value or Data of dipole moments.
     :param inclinations: Value or Data of dipole inclination angles.
     :param declinations: Value or Data of dipole declination angles.
-    :param earth_inc: Earth's field inclination angle.
-    :param earth_dec: Earth's field declination angle.
+    :param earth_inc: Value or Data of Earth's field inclination angles on the
+        receivers.
+    :param earth_dec: Value or Data of Earth's field declination angles on the
+        receivers.
+    :param profiler: Profiler timing the stages of the simulation.
+    :param gradients: Add the gradient tensor and analytic signal to the outputs.
+    :param susceptibilities: Data of magnetic susceptibility (SI) of the sources.
+    :param volumes: Value or Data of the volumes of the sources, computed from the
+        cells of BlockModel sources if omitted.
+    :param earth_strength: Intensity of Earth's field (nT), for induced moments.
+    :param geometry: Cache of the locations of the sources and receivers, keyed by
+        uid, re-used between simulations on the same workspace.
+    :param order: Sort the sources and receivers along a space-filling curve,
+        'morton' or 'hilbert', for locality in memory. Receivers on grids keep their
+        order. Outputs are returned in the original order of the receivers.
 
     :return b_field: List of Data entities.
     """
+    from profiling import Profiler
+
+    if profiler is None:
+        profiler = Profiler()
+
+    inputs = simulation_inputs(
+        sources,
+        receivers,
+        moments,
+        inclinations,
+        declinations,
+        earth_inc,
+        earth_dec,
+        susceptibilities=susceptibilities,
+        volumes=volumes,
+        earth_strength=earth_strength,
+        geometry=geometry,
+        profiler=profiler,
+    )
+    outputs = simulate_fields(
+        **inputs, gradients=gradients, profiler=profiler, order=order
+    )
+
+    with profiler.stage("add_data"):
+        # Add data to receiver object, all at once
+        data = receivers.add_data(outputs)
+
+    return data
+
+
+def simulation_inputs(
+    sources: ObjectBase,
+    receivers: ObjectBase,
+    moments: Data | float,
+    inclinations: Data | float,
+    declinations: Data | float,
+    earth_inc: Data | float,
+    earth_dec: Data | float,
+    susceptibilities: Data | None = None,
+    volumes: Data | float | None = None,
+    earth_strength: float = 50000.0,
+    geometry: dict | None = None,
+    profiler: Profiler | None = None,
+    tiled: bool = True,
+) -> dict:
+    """
+    Gather the locations, moment vectors and Earth's field of a simulation as arrays.
+
+    See magnetic_simulator for the parameters.
+
+    :param tiled: Keep Grid2D receivers, for their coordinates to be generated tile
+        by tile, rather than their array of centroids.
+
+    :return: Keyword arguments of simulate_fields.
+    """
+    from profiling import Profiler
+
+    import numpy as np
+    from geoh5py.data import Data
+
+    mu_0 = 4 * np.pi * 1e-7
+
+    if profiler is None:
+        profiler = Profiler()
 
     def locations(entity):
+        if geometry is not None and entity.uid in geometry:
+            return geometry[entity.uid]
+
         if hasattr(entity, "centroids"):
-            return entity.centroids
+            values = entity.centroids
+        else:
+            values = entity.vertices
+
+        if geometry is not None:
+            geometry[entity.uid] = values
 
-        return entity.vertices
+        return values
 
-    # Extract dipole coordinates
-    dipoles = locations(sources)
+    with profiler.stage("locations"):
+        # Extract dipole coordinates
+        dipoles = locations(sources)
 
-    # Extract receiver coordinates
-    observations = locations(receivers)
+        # Extract receiver coordinates, generated tile by tile for grids
+        if tiled and getattr(receivers, "u_count", None) is not None:
+            observations = receivers
+        else:
+            observations = locations(receivers)
 
     def vectorize(entity):
         if isinstance(entity, Data):
@@ -97,42 +455,191 @@ def magnetic_simulator(
 
         return np.ones(dipoles.shape[0]) * entity
 
-    # Get dipole moment values
-    mom = vectorize(moments)
-    # Get dipole inclination values
-    inc = vectorize(inclinations)
-    # Get dipole declination values
-    dec = vectorize(declinations)
-
-    # Loop over the dipoles
-    fields = np.zeros_like(observations)
-
-    for source, moment, inclination, declination in zip(dipoles, mom, inc, dec):
-        fields += b_field(source, observations, moment, inclination, declination)
-
-    tmi = tmi_projection(fields, (earth_inc, earth_dec))
-
-    # Add data to receiver object
-    data = receivers.add_data(
-        {
-            "b_x": {"values": fields[:, 0]},
-            "b_y": {"values": fields[:, 1]},
-            "b_z": {"values": fields[:, 2]},
-            "tmi": {"values": tmi},
-        }
-    )
+    with profiler.stage("vectorize"):
+        # Get Earth's field angles, constant or on each receiver
+        earth_field = [
+            angle.values if isinstance(angle, Data) else angle
+            for angle in (earth_inc, earth_dec)
+        ]
+
+        if susceptibilities is not None:
+            # Induced moments (A.m^2) along the inducing field, in nT
+            volume = cell_volumes(sources) if volumes is None else vectorize(volumes)
+            mom = susceptibilities.values * volume * earth_strength * 1e-9 / mu_0
+            # Mean of the unit vectors, as angles do not average across North
+            direction = np.mean(
+                inclination_declination_2_xyz(*earth_field), axis=0, keepdims=True
+            )
+            direction /= np.linalg.norm(direction)
+        else:
+            # Get dipole moment values
+            mom = vectorize(moments)
+            # Get dipole directions from inclination and declination values
+            direction = inclination_declination_2_xyz(
+                vectorize(inclinations), vectorize(declinations)
+            )
+
+        # Dipole moment vectors
+        vectors = mom[:, None] * direction
+
+    return {
+        "dipoles": dipoles,
+        "vectors": vectors,
+        "receivers": observations,
+        "earth_field": earth_field,
+    }
+
+
+def simulate_fields(
+    dipoles,
+    vectors,
+    receivers,
+    earth_field,
+    gradients: bool = False,
+    profiler: Profiler | None = None,
+    order: str | None = None,
+) -> dict:
+    """
+    Compute the outputs of a simulation, without access to the workspace.
+
+    :param dipoles: Array of dipole locations, shape(m, 3).
+    :param vectors: Array of dipole moment vectors (A.m^2), shape(m, 3).
+    :param receivers: Array of observation locations, shape(n, 3), or Grid2D object.
+    :param earth_field: Inclination and declination angles of Earth's field, either
+        values or arrays of shape(n,).
+    :param gradients: Add the gradient tensor and analytic signal to the outputs.
+    :param profiler: Profiler timing the stages of the simulation.
+    :param order: Sort the sources and the array of receivers along a space-filling
+        curve, 'morton' or 'hilbert', see magnetic_simulator.
+
+    :return: Values of the outputs, keyed by name, as for ObjectBase.add_data.
+    """
+    from profiling import Profiler
+
+    import numpy as np
+
+    if profiler is None:
+        profiler = Profiler()
+
+    receiver_order = None
+    if order is not None:
+        from space_filling import space_filling_order
+
+        with profiler.stage("reorder"):
+            source_order = space_filling_order(dipoles, order)
+            dipoles, vectors = dipoles[source_order], vectors[source_order]
+
+            if isinstance(receivers, np.ndarray):
+                receiver_order = space_filling_order(receivers, order)
+                receivers = receivers[receiver_order]
+
+    def restore(array):
+        # Back to the order of the receivers
+        if receiver_order is not None:
+            with profiler.stage("reorder"):
+                array[receiver_order] = array.copy()
+
+    # All the dipoles at once, by blocks
+    if isinstance(receivers, np.ndarray):
+        tiles = [(slice(None), receivers)]
+        size = receivers.shape[0]
+    else:
+        tiles = grid_tiles(receivers)
+        size = receivers.u_count * receivers.v_count
+
+    fields = np.zeros((size, 3))
+    gradient = {}
+    if gradients:
+        tensor = np.zeros((size, 3, 3))
+        with profiler.stage("dipoles"):
+            for cells, points in tiles:
+                fields[cells], tensor[cells] = dipole_fields(
+                    dipoles, points, vectors, True
+                )
+
+        restore(tensor)
+        with profiler.stage("gradients"):
+            gradient = gradient_outputs(tensor, earth_field)
+    else:
+        with profiler.stage("dipoles"):
+            for cells, points in tiles:
+                fields[cells] = dipole_fields(dipoles, points, vectors)
+
+    restore(fields)
+    with profiler.stage("tmi_projection"):
+        tmi = tmi_projection(fields, earth_field)
+
+    return {
+        "b_x": {"values": fields[:, 0]},
+        "b_y": {"values": fields[:, 1]},
+        "b_z": {"values": fields[:, 2]},
+        "tmi": {"values": tmi},
+        **gradient,
+    }
+
+
+def gradient_outputs(tensor, earth_field) -> dict:
+    """
+    Components of the gradient tensor and amplitude of the analytic signal of the TMI.
 
-    return data
+    :param tensor: Array of symmetric gradient tensors (nT/m), shape(n, 3, 3).
+    :param earth_field: Inclination and declination angles of Earth's field, either
+        values or arrays of shape(n,).
+
+    :return: Values of b_xx, b_xy, ... and analytic_signal, as for ObjectBase.add_data.
+    """
+    import numpy as np
+
+    outputs = {
+        f"b_{'xyz'[i]}{'xyz'[j]}": {"values": tensor[:, i, j]}
+        for i, j in zip(*np.triu_indices(3))
+    }
 
+    # Gradient of the TMI, projecting the gradient of each component
+    h0 = inclination_declination_2_xyz(*earth_field)
+    h0 = np.broadcast_to(h0, tensor.shape[:2])
+    tmi_gradient = np.einsum("ni,nij->nj", h0, tensor)
+    outputs["analytic_signal"] = {"values": np.linalg.norm(tmi_gradient, axis=1)}
 
-def run(file: str):
+    return outputs
+
+
+def run(file: str, cache: InputFileCache | None = None, geometry: dict | None = None):
     """
     Run the mag_dipole simulation from InputFile.
+
+    Stages are profiled if requested by the 'profile' flag of the ui.json, or by the
+    MAG_DIPOLE_PROFILE environment variable (see profiling.py). The report is written
+    to the monitoring directory, or next to the ui.json file.
+
+    :param file: Path to the ui.json file.
+    :param cache: Cache of parsed ui.json files, re-used between runs.
+    :param geometry: Cache of the locations of entities, re-used between runs on the
+        same workspace.
+
+    :return: List of Data entities added to the receivers.
     """
-    ifile = InputFile.read_ui_json(file).data
+    from profiling import Profiler
+
+    from geoh5py.ui_json.utils import monitored_directory_copy
+    from ui_json_cache import InputFileCache
+
+    if cache is None:
+        cache = InputFileCache()
+
+    profiler = Profiler.from_environment()
+    profiler.start()
+
+    with profiler.stage("read_ui_json"):
+        ifile = cache.read_ui_json(file)
+
+    # Timings requested from the ui.json start after reading it
+    if ifile.get("profile") and not profiler.enabled:
+        profiler = Profiler.from_environment(enabled=True)
+        profiler.start()
 
     with ifile["geoh5"].open(mode="r+"):
-        magnetic_simulator(
+        data = magnetic_simulator(
             ifile["sources"],
             ifile["receivers"],
             ifile["moments"],
@@ -140,15 +647,44 @@ def run(file: str):
             ifile["declination"],
             ifile["earth_inc"],
             ifile["earth_dec"],
+            profiler=profiler,
+            gradients=bool(ifile.get("gradients")),
+            susceptibilities=ifile.get("susceptibility"),
+            volumes=ifile.get("volume"),
+            earth_strength=ifile.get("earth_strength", 50000.0),
+            geometry=geometry,
         )
 
         if ifile["monitoring_directory"] is not None:
-            monitored_directory_copy(ifile["monitoring_directory"], ifile["receivers"])
+            with profiler.stage("monitored_directory_copy"):
+                monitored_directory_copy(
+                    ifile["monitoring_directory"], ifile["receivers"]
+                )
+
+    cache.update(file)
+
+    profiler.stop()
+    report = profiler.write(
+        ifile["monitoring_directory"] or os.path.dirname(os.path.abspath(file))
+    )
+    if report is not None:
+        print(f"# Profiling report written to {report}")
+
+    return data
 
 
 if __name__ == "__main__":
+    from mag_dipole_server import submit
+
     file = sys.argv[1]
-    run(file)
+
+    # Hand over to a running worker, if any (see mag_dipole_server.py)
+    reply = submit(file)
+
+    if reply is None:
+        run(file)
+    elif reply["status"] == "error":
+        sys.exit(reply["message"])
 
 
 #  Copyright (c) 2022 Mira Geoscience Ltd.
@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+
+"""
+Batch runner of mag_dipole_app simulations for many ui.json files.
+
+Jobs are grouped by geoh5 file and ordered by sources and receivers within a group,
+so that the locations of the sources and receivers are loaded once per group. The main
+process is the only one to access the geoh5 files: it reads the inputs of each job and
+writes its outputs, one job after the other. The fields are computed in parallel on a
+pool of processes, from arrays only, with a bounded number of jobs in flight. A summary
+of runtime and throughput per job is written as JSON.
+
+Usage:
+> python mag_dipole_batch.py "jobs/*.ui.json" [--workers 4] [--summary summary.json]
+> python mag_dipole_batch.py jobs --watch 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import os
+import traceback
+from collections import defaultdict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import contextmanager
+from time import perf_counter, sleep
+
+
+def find_jobs(patterns: list[str]) -> list[str]:
+    """
+    List the ui.json files from glob patterns or directories.
+
+    :param patterns: Glob patterns or directories containing ui.json files.
+
+    :return: Sorted absolute paths of the files found.
+    """
+    files = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "*.ui.json")
+
+        files.update(os.path.abspath(file) for file in glob.glob(pattern))
+
+    return sorted(files)
+
+
+def group_jobs(files: list[str]) -> dict[str, list[str]]:
+    """
+    Group ui.json files by geoh5, ordered by sources and receivers within a group.
+
+    :param files: Paths to ui.json files.
+
+    :return: Files grouped by geoh5 path, relative paths being resolved against the
+        directory of the ui.json file.
+    """
+
+    def value(form):
+        return str(form.get("value") if isinstance(form, dict) else form)
+
+    groups = defaultdict(list)
+    for file in files:
+        with open(file, encoding="utf-8") as ui_json:
+            content = json.load(ui_json)
+
+        geometry = (value(content.get("sources")), value(content.get("receivers")))
+        geoh5 = os.path.join(os.path.dirname(file), str(content.get("geoh5")))
+        groups[os.path.abspath(geoh5)].append((geometry, file))
+
+    return {geoh5: [file for _, file in sorted(jobs)] for geoh5, jobs in groups.items()}
+
+
+@contextmanager
+def working_directory(path: str):
+    """Change the working directory of the process, restored on exit."""
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def read_job(file: str, cache, geometry: dict) -> tuple[dict, dict]:
+    """
+    Read the inputs of a simulation from its ui.json file and geoh5.
+
+    :param file: Path to a ui.json file.
+    :param cache: InputFileCache of the parsed ui.json files.
+    :param geometry: Locations of the entities of the workspace, keyed by uid.
+
+    :return: Data of the InputFile and keyword arguments of simulate_fields.
+    """
+    from mag_dipole_app import simulation_inputs
+
+    # Relative geoh5 paths are resolved against the ui.json, as when grouping
+    with working_directory(os.path.dirname(file)):
+        ifile = cache.read_ui_json(file)
+
+        with ifile["geoh5"].open(mode="r"):
+            inputs = simulation_inputs(
+                ifile["sources"],
+                ifile["receivers"],
+                ifile["moments"],
+                ifile["inclination"],
+                ifile["declination"],
+                ifile["earth_inc"],
+                ifile["earth_dec"],
+                susceptibilities=ifile.get("susceptibility"),
+                volumes=ifile.get("volume"),
+                earth_strength=ifile.get("earth_strength", 50000.0),
+                geometry=geometry,
+                tiled=False,
+            )
+
+    inputs["gradients"] = bool(ifile.get("gradients"))
+
+    return ifile, inputs
+
+
+def write_job(file: str, ifile: dict, outputs: dict, cache) -> int:
+    """
+    Write the outputs of a simulation to the receivers of its geoh5.
+
+    :param file: Path to the ui.json file of the job.
+    :param ifile: Data of the InputFile.
+    :param outputs: Values of the outputs, as returned by simulate_fields.
+    :param cache: InputFileCache of the parsed ui.json files.
+
+    :return: Number of receivers.
+    """
+    from geoh5py.ui_json.utils import monitored_directory_copy
+
+    with working_directory(os.path.dirname(file)), ifile["geoh5"].open(mode="r+"):
+        data = ifile["receivers"].add_data(outputs)
+
+        if ifile["monitoring_directory"] is not None:
+            monitored_directory_copy(ifile["monitoring_directory"], ifile["receivers"])
+
+    cache.update(file)
+
+    return len(data[0].values)
+
+
+def run_jobs(groups: dict[str, list[str]], pool: Executor, window: int):
+    """
+    Run the simulations of groups of ui.json files.
+
+    The inputs are read and the outputs written in this process, in the order of the
+    jobs, while at most 'window' jobs are computed on the pool.
+
+    :param groups: Files grouped by geoh5, as returned by group_jobs.
+    :param pool: Executor computing the fields.
+    :param window: Maximum number of jobs submitted and not yet written.
+
+    :return: Generator of the summary of each job, in the order of the jobs.
+    """
+    from mag_dipole_app import simulate_fields
+    from ui_json_cache import InputFileCache
+
+    cache = InputFileCache()
+    in_flight = deque()
+
+    def summary(file, start, status="done", receivers=0):
+        seconds = perf_counter() - start
+        return {
+            "file": file,
+            "status": status,
+            "receivers": receivers,
+            "seconds": seconds,
+            "receivers_per_second": receivers / seconds,
+        }
+
+    def write(file, start, ifile, future):
+        try:
+            receivers = write_job(file, ifile, future.result(), cache)
+        except Exception:  # pylint: disable=broad-except
+            return summary(file, start, traceback.format_exc())
+
+        return summary(file, start, receivers=receivers)
+
+    for files in groups.values():
+        geometry = {}
+        for file in files:
+            start = perf_counter()
+            try:
+                ifile, inputs = read_job(file, cache, geometry)
+            except Exception:  # pylint: disable=broad-except
+                yield summary(file, start, traceback.format_exc())
+                continue
+
+            in_flight.append(
+                (file, start, ifile, pool.submit(simulate_fields, **inputs))
+            )
+            while len(in_flight) >= window:
+                yield write(*in_flight.popleft())
+
+    while in_flight:
+        yield write(*in_flight.popleft())
+
+
+def run_batch(
+    patterns: list[str],
+    workers: int | None = None,
+    summary_file: str = "batch_summary.json",
+    watch: float | None = None,
+):
+    """
+    Run the simulations of all ui.json files found, on a pool of processes.
+
+    :param patterns: Glob patterns or directories containing ui.json files.
+    :param workers: Number of processes computing the fields. Defaults to the number
+        of cores.
+    :param summary_file: Output JSON file summarizing the jobs.
+    :param watch: Interval (s) between searches for new files. Stops once all
+        files have run if None.
+    """
+    workers = workers or os.cpu_count() or 1
+    start = perf_counter()
+    done = {}
+    summaries = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            files = [
+                file
+                for file in find_jobs(patterns)
+                if done.get(file) != os.stat(file).st_mtime_ns
+            ]
+            done.update({file: os.stat(file).st_mtime_ns for file in files})
+            for summary in run_jobs(group_jobs(files), pool, window=2 * workers):
+                print(
+                    f"-- {summary['file']}: {summary['status'].splitlines()[-1]}"
+                    f" in {summary['seconds']:.3f} s"
+                )
+                summaries.append(summary)
+
+            if files:
+                write_summary(summaries, perf_counter() - start, summary_file)
+
+            if watch is None:
+                break
+
+            sleep(watch)
+
+
+def write_summary(summaries: list[dict], seconds: float, summary_file: str):
+    """
+    Write the summary of jobs with the overall throughput.
+
+    :param summaries: Summary of each job.
+    :param seconds: Elapsed time since the start of the batch.
+    :param summary_file: Output JSON file.
+    """
+    with open(summary_file, "w", encoding="utf-8") as file:
+        json.dump(
+            {
+                "jobs": len(summaries),
+                "failed": sum(summary["status"] != "done" for summary in summaries),
+                "seconds": seconds,
+                "jobs_per_second": len(summaries) / seconds,
+                "summaries": summaries,
+            },
+            file,
+            indent=4,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Batch runner of mag_dipole_app simulations."
+    )
+    parser.add_argument(
+        "patterns", nargs="+", help="Glob patterns or directories of ui.json files."
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--summary", default="batch_summary.json")
+    parser.add_argument(
+        "--watch",
+        type=float,
+        default=None,
+        help="Keep watching for new files, every WATCH seconds.",
+    )
+    args = parser.parse_args()
+
+    run_batch(args.patterns, args.workers, args.summary, args.watch)
+
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
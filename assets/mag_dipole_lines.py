@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+"""
+Streaming simulation of mag_dipole_app fields along airborne flight lines.
+
+Receivers are read, simulated and written one flight line at a time, so memory is
+proportional to the longest line rather than to the whole survey. Dipoles are sorted
+once along Easting, and only those within a radius of the bounding box of a line
+contribute to it, if a radius is given.
+
+Flight lines are read from a CSV file with columns line, x, y and z, with the
+fiducials of each line on consecutive rows. Dipoles are read from a CSV file with
+columns x, y, z, moment, inclination and declination.
+
+Usage:
+> python mag_dipole_lines.py survey.csv dipoles.csv output.csv --earth-inc -62.11 --earth-dec -17.9 [--radius 5000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+from itertools import groupby
+from typing import Iterable, Iterator
+
+import numpy as np
+from mag_dipole_app import dipole_fields, inclination_declination_2_xyz, tmi_projection
+
+COMPONENTS = ("b_x", "b_y", "b_z", "tmi")
+
+
+def read_lines(file: str, chunk_size: int = 10000) -> Iterator[tuple[str, np.ndarray]]:
+    """
+    Read flight lines from a CSV file, one line at a time.
+
+    :param file: CSV file with columns line, x, y and z.
+    :param chunk_size: Number of rows parsed at once.
+
+    :return: Generator of the line identifier and locations, shape(n, 3).
+    """
+    with open(file, encoding="utf-8", newline="") as csv_file:
+        reader = csv.reader(csv_file)
+        header = [name.strip().lower() for name in next(reader)]
+        columns = [header.index(name) for name in ("line", "x", "y", "z")]
+
+        for line, rows in groupby(reader, key=lambda row: row[columns[0]]):
+            chunks, chunk = [], []
+            for row in rows:
+                chunk.append([row[ind] for ind in columns[1:]])
+                if len(chunk) == chunk_size:
+                    chunks.append(np.asarray(chunk, dtype=float))
+                    chunk = []
+
+            if chunk:
+                chunks.append(np.asarray(chunk, dtype=float))
+
+            yield line, np.vstack(chunks)
+
+
+def read_dipoles(file: str) -> np.ndarray:
+    """
+    Read dipoles from a CSV file.
+
+    :param file: CSV file with columns x, y, z, moment, inclination and declination.
+
+    :return: Array of dipole parameters in that order, shape(m, 6).
+    """
+    table = np.genfromtxt(file, delimiter=",", names=True, ndmin=1)
+    names = {name.lower(): name for name in table.dtype.names}
+
+    return np.column_stack(
+        [
+            table[names[name]]
+            for name in ("x", "y", "z", "moment", "inclination", "declination")
+        ]
+    )
+
+
+def simulate_lines(
+    lines: Iterable[tuple[str, np.ndarray]],
+    dipoles: np.ndarray,
+    earth_inc: float,
+    earth_dec: float,
+    radius: float | None = None,
+) -> Iterator[tuple[str, np.ndarray, np.ndarray]]:
+    """
+    Compute the magnetic field of dipoles along flight lines, one line at a time.
+
+    :param lines: Iterable of line identifier and locations, shape(n, 3).
+    :param dipoles: Array of dipole locations, moments, inclination and declination
+        angles, shape(m, 6).
+    :param earth_inc: Earth's field inclination angle.
+    :param earth_dec: Earth's field declination angle.
+    :param radius: Maximum horizontal distance of the dipoles from the bounding box
+        of a line, or None to include all dipoles.
+
+    :return: Generator of line identifier, locations and array of b_x, b_y, b_z
+        and tmi, shape(n, 4).
+    """
+    dipoles = dipoles[np.argsort(dipoles[:, 0], kind="stable")]
+
+    for line, locations in lines:
+        selection = dipoles
+        if radius is not None:
+            low = locations[:, :2].min(axis=0) - radius
+            high = locations[:, :2].max(axis=0) + radius
+            start, end = np.searchsorted(dipoles[:, 0], [low[0], high[0]], "left")
+            selection = dipoles[start:end]
+            selection = selection[
+                (selection[:, 1] >= low[1]) & (selection[:, 1] <= high[1])
+            ]
+
+        # All the dipoles of the line at once, by blocks
+        fields = dipole_fields(
+            selection[:, :3],
+            locations,
+            selection[:, 3:4]
+            * inclination_declination_2_xyz(selection[:, 4], selection[:, 5]),
+        )
+
+        tmi = tmi_projection(fields, (earth_inc, earth_dec))
+
+        yield line, locations, np.c_[fields, tmi.T]
+
+
+def write_lines(
+    file: str, results: Iterable[tuple[str, np.ndarray, np.ndarray]]
+) -> int:
+    """
+    Write simulated flight lines to a CSV file as they are computed.
+
+    :param file: Output CSV file, with columns line, x, y, z, b_x, b_y, b_z and tmi.
+    :param results: Iterable of line identifier, locations and simulated values.
+
+    :return: Number of rows written.
+    """
+    count = 0
+    with open(file, "w", encoding="utf-8", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(("line", "x", "y", "z") + COMPONENTS)
+
+        for line, locations, values in results:
+            writer.writerows([line] + row for row in np.c_[locations, values].tolist())
+            count += locations.shape[0]
+
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Streaming mag_dipole_app simulation along flight lines."
+    )
+    parser.add_argument("survey", help="CSV file of fiducials (line, x, y, z).")
+    parser.add_argument("dipoles", help="CSV file of dipoles.")
+    parser.add_argument("output", help="CSV file of simulated fields.")
+    parser.add_argument("--earth-inc", type=float, required=True)
+    parser.add_argument("--earth-dec", type=float, required=True)
+    parser.add_argument(
+        "--radius",
+        type=float,
+        default=None,
+        help="Ignore dipoles further than RADIUS from a line.",
+    )
+    args = parser.parse_args()
+
+    rows = write_lines(
+        args.output,
+        simulate_lines(
+            read_lines(args.survey),
+            read_dipoles(args.dipoles),
+            args.earth_inc,
+            args.earth_dec,
+            radius=args.radius,
+        ),
+    )
+    print(f"{rows} fiducials written to {args.output}")
+
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
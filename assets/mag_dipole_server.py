@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+
+"""
+Long-lived worker running mag_dipole_app simulations sent over a local socket.
+
+Starting the worker once keeps the interpreter, the imports and the parsed ui.json
+files in memory between runs, with the locations of the entities of each workspace.
+While it is alive, ``python mag_dipole_app.py file``
+acts as a thin client passing the ui.json path to the worker, and falls back to
+running locally if no worker is found. Modules of the assets folder edited since they
+were imported are reloaded before each run.
+
+Usage:
+> python mag_dipole_server.py [--port 0]
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+_address_file = Path(tempfile.gettempdir()) / "python-training" / "mag_dipole.json"
+
+
+def module_stamps(folder: Path) -> dict[str, int]:
+    """Modification times (ns) of the modules imported from a folder."""
+    stamps = {}
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None)
+        if name in ("__main__", __name__) or path is None:
+            continue
+
+        if Path(path).resolve().parent == folder:
+            stamps[name] = os.stat(path).st_mtime_ns
+
+    return stamps
+
+
+def reload_modules(folder: Path, stamps: dict[str, int]) -> list[str]:
+    """
+    Reload the modules of a folder modified since they were last loaded.
+
+    :param folder: Directory of the modules.
+    :param stamps: Modification times of the modules when loaded, updated in place.
+        Modules imported since the last call are added.
+
+    :return: Names of the modules reloaded.
+    """
+    current = module_stamps(folder)
+    changed = [
+        name
+        for name, mtime in current.items()
+        if stamps.setdefault(name, mtime) != mtime
+    ]
+
+    # The entry point last, its dependencies are imported when called
+    for name in sorted(changed, key=lambda name: name == "mag_dipole_app"):
+        importlib.reload(sys.modules[name])
+        stamps[name] = current[name]
+
+    return changed
+
+
+class GeometryCache:
+    """
+    Locations of the sources and receivers kept between runs, per workspace.
+
+    The locations of a workspace are dropped when its geoh5 file was modified since
+    the last run recorded with update, by another application or process.
+    """
+
+    def __init__(self):
+        self._workspaces: dict[str, tuple[int, dict]] = {}
+
+    @staticmethod
+    def stamp(file: str) -> tuple[str | None, int | None]:
+        """
+        Locate the geoh5 of a ui.json file.
+
+        :param file: Path to a ui.json file.
+
+        :return: Resolved path to the geoh5 file and its modification time (ns), or
+            None if not found. Relative paths are resolved against the directory of
+            the ui.json file.
+        """
+        with open(file, encoding="utf-8") as ui_json:
+            geoh5 = json.load(ui_json).get("geoh5")
+
+        if not isinstance(geoh5, str) or not geoh5:
+            return None, None
+
+        path = (Path(file).parent / geoh5).resolve()
+        try:
+            return str(path), path.stat().st_mtime_ns
+        except OSError:
+            return str(path), None
+
+    def get(self, file: str) -> dict | None:
+        """
+        Get the locations cached for the workspace of a ui.json file.
+
+        :param file: Path to a ui.json file.
+
+        :return: Locations keyed by uid, filled by the run, or None if the geoh5 is
+            not found.
+        """
+        geoh5, mtime = self.stamp(file)
+
+        if mtime is None:
+            return None
+
+        if geoh5 not in self._workspaces or self._workspaces[geoh5][0] != mtime:
+            self._workspaces[geoh5] = (mtime, {})
+
+        return self._workspaces[geoh5][1]
+
+    def update(self, file: str):
+        """
+        Record the state of the workspace after a run wrote its outputs to it.
+
+        :param file: Path to the ui.json file used for the run.
+        """
+        geoh5, mtime = self.stamp(file)
+
+        if geoh5 in self._workspaces and mtime is not None:
+            self._workspaces[geoh5] = (mtime, self._workspaces[geoh5][1])
+
+
+def serve(port: int = 0):
+    """
+    Run simulations sent by clients until a 'shutdown' message is received.
+
+    The address and authentication key of the worker are written to a file only
+    readable by the current user, and removed on exit.
+
+    :param port: Port to listen to on localhost. Use 0 for any free port.
+    """
+    import secrets
+    import traceback
+    from multiprocessing.connection import Listener
+
+    # Warm-up the imports deferred by mag_dipole_app before accepting runs
+    import geoh5py.ui_json.utils  # pylint: disable=unused-import
+    import mag_dipole_app
+    import numpy  # pylint: disable=unused-import
+    from ui_json_cache import InputFileCache
+
+    cache = InputFileCache()
+    geometry = GeometryCache()
+    authkey = secrets.token_bytes(32)
+    folder = Path(mag_dipole_app.__file__).resolve().parent
+    stamps = module_stamps(folder)
+
+    with Listener(("localhost", port), authkey=authkey) as listener:
+        _address_file.parent.mkdir(parents=True, exist_ok=True)
+        descriptor = os.open(
+            _address_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600
+        )
+        with open(descriptor, "w", encoding="utf-8") as file:
+            json.dump({"port": listener.address[1], "authkey": authkey.hex()}, file)
+
+        print(f"# Listening on {listener.address[0]}:{listener.address[1]} ...")
+        try:
+            while True:
+                with listener.accept() as connection:
+                    message = connection.recv()
+
+                    if message == "shutdown":
+                        connection.send({"status": "shutdown"})
+                        break
+
+                    start = perf_counter()
+                    try:
+                        reloaded = reload_modules(folder, stamps)
+                        if reloaded:
+                            print(f"# Reloaded {', '.join(reloaded)}")
+                            if "ui_json_cache" in reloaded:
+                                cache = sys.modules["ui_json_cache"].InputFileCache()
+
+                        mag_dipole_app.run(
+                            message, cache=cache, geometry=geometry.get(message)
+                        )
+                        geometry.update(message)
+                        reply = {"status": "done"}
+                    except Exception:  # pylint: disable=broad-except
+                        reply = {"status": "error", "message": traceback.format_exc()}
+
+                    reply["seconds"] = perf_counter() - start
+                    print(
+                        f"-- {message}: {reply['status']} in {reply['seconds']:.3f} s"
+                    )
+                    connection.send(reply)
+        finally:
+            _address_file.unlink(missing_ok=True)
+
+
+def submit(message: str) -> dict | None:
+    """
+    Send a ui.json file, or 'shutdown', to a running worker and wait for its reply.
+
+    :param message: Path to a ui.json file, or 'shutdown'.
+
+    :return: Reply of the worker, or None if no worker is running.
+    """
+    if not _address_file.exists():
+        return None
+
+    # Only paid by the clients of a running worker
+    from multiprocessing import AuthenticationError
+    from multiprocessing.connection import Client
+
+    try:
+        with open(_address_file, encoding="utf-8") as file:
+            address = json.load(file)
+        connection = Client(
+            ("localhost", address["port"]), authkey=bytes.fromhex(address["authkey"])
+        )
+    except (AuthenticationError, OSError, ValueError, KeyError):
+        return None
+
+    if message != "shutdown":
+        message = os.path.abspath(message)
+
+    with connection:
+        connection.send(message)
+        return connection.recv()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Long-lived worker running mag_dipole_app simulations."
+    )
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument(
+        "--shutdown", action="store_true", help="Stop the running worker."
+    )
+    args = parser.parse_args()
+
+    if args.shutdown:
+        if submit("shutdown") is None:
+            print("# No worker running.")
+    else:
+        serve(args.port)
+
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
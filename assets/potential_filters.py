@@ -0,0 +1,229 @@
+"""
+Potential field filters in the Fourier domain, for data on Grid2D objects.
+
+Filters are transfer functions of the wavenumbers, multiplied together to chain
+them. The grid is padded and transformed once with a real FFT, then transformed back
+once per output. The wavenumbers are cached by padded shape and cell size, while
+FFT plans are cached by the FFT library for repeated shapes.
+
+Angles follow the convention of ``mag_dipole_app``: inclination positive down and
+declination clockwise from North. The wavenumbers are rotated with the grid, so that
+directions are geographic whatever the rotation of the grid.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable
+
+import numpy as np
+from grid_plotting import grid_values
+from mag_dipole_app import inclination_declination_2_xyz
+
+try:
+    from scipy import fft
+    from scipy.fft import next_fast_len
+
+    FFT_OPTIONS = {"workers": -1}
+except ImportError:
+    fft = np.fft
+    FFT_OPTIONS = {}
+
+    def next_fast_len(target: int) -> int:
+        """Smallest 5-smooth length larger or equal to target."""
+        length = target
+        while True:
+            value = length
+            for factor in (2, 3, 5):
+                while value % factor == 0:
+                    value //= factor
+            if value == 1:
+                return length
+            length += 1
+
+
+if TYPE_CHECKING:
+    from geoh5py.data import Data
+    from geoh5py.objects import Grid2D
+
+Filter = Callable[[np.ndarray, np.ndarray, np.ndarray], np.ndarray]
+
+
+@lru_cache(maxsize=16)
+def wavenumbers(
+    shape: tuple[int, int], u_cell_size: float, v_cell_size: float, rotation: float
+):
+    """
+    Wavenumbers (rad/m) of the real FFT of an array of shape (v, u).
+
+    :param shape: Shape of the array.
+    :param u_cell_size: Size of the cells along u.
+    :param v_cell_size: Size of the cells along v.
+    :param rotation: Counter-clockwise angle (degrees) of the u axis from East.
+
+    :return: Wavenumbers along East, along North and their norm, each of
+        shape(v, u // 2 + 1).
+    """
+    k_u = 2 * np.pi * np.fft.rfftfreq(shape[1], u_cell_size)[None, :]
+    k_v = 2 * np.pi * np.fft.fftfreq(shape[0], v_cell_size)[:, None]
+    angle = np.deg2rad(rotation)
+    k_x = k_u * np.cos(angle) - k_v * np.sin(angle)
+    k_y = k_u * np.sin(angle) + k_v * np.cos(angle)
+    k_r = np.hypot(k_u, k_v)
+
+    for array in (k_x, k_y, k_r):
+        array.flags.writeable = False
+
+    return k_x, k_y, k_r
+
+
+def upward_continuation(height: float) -> Filter:
+    """Continue the field upward by a height, or downward if negative."""
+
+    def transfer(_k_x, _k_y, k_r):
+        return np.exp(-height * k_r)
+
+    return transfer
+
+
+def vertical_derivative(order: int = 1) -> Filter:
+    """Derivative along the vertical, positive up, of the field."""
+
+    def transfer(_k_x, _k_y, k_r):
+        return (-k_r) ** order
+
+    return transfer
+
+
+def horizontal_derivative(axis: str = "x", order: int = 1) -> Filter:
+    """Derivative along Easting (x) or Northing (y) of the field."""
+    if axis not in ("x", "y"):
+        raise ValueError("Axis should be one of 'x' or 'y'.")
+
+    def transfer(k_x, k_y, _k_r):
+        return (1j * (k_x if axis == "x" else k_y)) ** order
+
+    return transfer
+
+
+def reduce_to_pole(
+    inclination: float,
+    declination: float,
+    magnetization: tuple[float, float] | None = None,
+) -> Filter:
+    """
+    Reduction to the pole of TMI data, for the direction of the inducing field and
+    of the magnetization, induced by default. Unstable at low inclinations.
+
+    :param inclination: Inclination angle of the inducing field.
+    :param declination: Declination angle of the inducing field.
+    :param magnetization: Inclination and declination angles of the magnetization.
+    """
+    field = inclination_declination_2_xyz(inclination, declination)[0]
+    moment = (
+        field
+        if magnetization is None
+        else inclination_declination_2_xyz(*magnetization)[0]
+    )
+
+    def transfer(k_x, k_y, k_r):
+        k_safe = np.where(k_r == 0, 1.0, k_r)
+        # Derivatives along the directions, relative to the vertical one, positive down
+        factors = [
+            -vector[2] + 1j * (vector[0] * k_x + vector[1] * k_y) / k_safe
+            for vector in (field, moment)
+        ]
+        # The mean is left unchanged
+        return np.where(k_r == 0, 1.0, 1.0 / (factors[0] * factors[1]))
+
+    return transfer
+
+
+def apply_filters(
+    array: np.ndarray,
+    cell_sizes: tuple[float, float],
+    chains: dict[str, list[Filter]],
+    padding: float = 0.5,
+    rotation: float = 0.0,
+) -> dict[str, np.ndarray]:
+    """
+    Apply chains of filters to a 2D array, sharing the forward transform.
+
+    The array is padded by reflection on each side, by a fraction of its size rounded
+    up to a fast FFT length. Nan values are filled with the mean for the transforms
+    and restored on the outputs.
+
+    :param array: 2D array of values, shape(v, u).
+    :param cell_sizes: Size of the cells along u and v.
+    :param chains: Lists of filters applied in sequence, for each output.
+    :param padding: Fraction of the size padded on each side.
+    :param rotation: Counter-clockwise angle (degrees) of the u axis from East.
+
+    :return: Filtered arrays, for each output.
+    """
+    blank = np.isnan(array)
+    filled = np.where(blank, np.nanmean(array), array)
+
+    shape = tuple(
+        next_fast_len(int(np.ceil(size * (1 + 2 * padding)))) for size in array.shape
+    )
+    before = [(length - size) // 2 for length, size in zip(shape, array.shape)]
+    padded = np.pad(
+        filled,
+        [
+            (start, length - size - start)
+            for start, length, size in zip(before, shape, array.shape)
+        ],
+        mode="reflect",
+    )
+    spectrum = fft.rfft2(padded, **FFT_OPTIONS)
+    k_x, k_y, k_r = wavenumbers(shape, *cell_sizes, rotation)
+
+    results = {}
+    for name, filters in chains.items():
+        transfer = np.ones_like(k_r, dtype=complex)
+        for transfer_function in filters:
+            transfer = transfer * transfer_function(k_x, k_y, k_r)
+
+        result = fft.irfft2(spectrum * transfer, s=shape, **FFT_OPTIONS)[
+            before[0] : before[0] + array.shape[0],
+            before[1] : before[1] + array.shape[1],
+        ]
+        result[blank] = np.nan
+        results[name] = result
+
+    return results
+
+
+def filter_grid(
+    grid: Grid2D,
+    values: Data | np.ndarray,
+    chains: dict[str, list[Filter]],
+    padding: float = 0.5,
+) -> list[Data]:
+    """
+    Filter data on a horizontal Grid2D and add the results to the grid.
+
+    :param grid: Horizontal Grid2D object.
+    :param values: Data or array of values on the grid cells.
+    :param chains: Lists of filters applied in sequence, for each output name.
+    :param padding: Fraction of the size padded on each side.
+
+    :return: List of Data added to the grid.
+    """
+    # Grid attributes are arrays of one value, not hashable by the wavenumbers cache
+    results = apply_filters(
+        grid_values(grid, values),
+        (float(np.r_[grid.u_cell_size][0]), float(np.r_[grid.v_cell_size][0])),
+        chains,
+        padding=padding,
+        rotation=float(np.r_[grid.rotation][0]),
+    )
+    data = grid.add_data(
+        {name: {"values": result.ravel()} for name, result in results.items()}
+    )
+
+    return data if isinstance(data, list) else [data]
+
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
@@ -0,0 +1,187 @@
+"""
+Timing and profiling instrumentation of application stages.
+
+A Profiler is disabled by default, in which case its stages are no-op context managers.
+It is enabled with the ``MAG_DIPOLE_PROFILE`` environment variable, set to a comma
+separated list of options among 'time', 'cprofile' and 'memory'. For example
+``MAG_DIPOLE_PROFILE=time,memory``.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from contextlib import nullcontext
+from pathlib import Path
+from time import perf_counter, time
+
+ENVIRONMENT_VARIABLE = "MAG_DIPOLE_PROFILE"
+OPTIONS = ("time", "cprofile", "memory")
+
+_null_stage = nullcontext()
+
+
+class Profiler:
+    """
+    Collect the wall time of named stages, with optional cProfile and tracemalloc.
+
+    :param options: Options among 'time', 'cprofile' and 'memory'. The profiler is
+        disabled if empty.
+    """
+
+    def __init__(self, options: tuple | list = ()):
+        for option in options:
+            if option not in OPTIONS:
+                raise ValueError(
+                    f"Profiling option '{option}' should be one of {OPTIONS}."
+                )
+
+        self.options = tuple(options)
+        self.stages: list[dict] = []
+        self._profile = None
+        self._start = None
+
+    @classmethod
+    def from_environment(cls, enabled: bool = False) -> Profiler:
+        """
+        Create a profiler from the environment variable.
+
+        :param enabled: Force timings, for example from a ui.json flag, if the
+            environment variable is not set.
+        """
+        value = os.environ.get(ENVIRONMENT_VARIABLE, "")
+        options = [option.strip() for option in value.split(",") if option.strip()]
+
+        if enabled and not options:
+            options = ["time"]
+
+        return cls(options)
+
+    @property
+    def enabled(self) -> bool:
+        """Whether the profiler collects anything."""
+        return bool(self.options)
+
+    def start(self):
+        """Start the cProfile and tracemalloc collection, if requested."""
+        if not self.enabled:
+            return
+
+        if "cprofile" in self.options:
+            import cProfile
+
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+        if "memory" in self.options:
+            import tracemalloc
+
+            tracemalloc.start()
+
+        self._start = perf_counter()
+
+    def stop(self):
+        """Stop the cProfile and tracemalloc collection."""
+        if self._profile is not None:
+            self._profile.disable()
+
+        if "memory" in self.options:
+            import tracemalloc
+
+            tracemalloc.stop()
+
+    def stage(self, name: str):
+        """
+        Context manager timing a named stage.
+
+        :param name: Name of the stage in the report.
+        """
+        if not self.enabled:
+            return _null_stage
+
+        return _Stage(self, name)
+
+    def report(self, top: int = 20) -> dict:
+        """
+        Structured report of the stages.
+
+        :param top: Number of functions with the largest cumulative time reported
+            from cProfile.
+        """
+        report: dict = {
+            "total": perf_counter() - self._start if self._start else None,
+            "stages": self.stages,
+        }
+
+        if self._profile is not None:
+            import pstats
+
+            stats = pstats.Stats(self._profile)
+            functions = sorted(
+                stats.stats.items(),  # type: ignore
+                key=lambda item: -item[1][3],
+            )
+            report["functions"] = [
+                {
+                    "function": f"{file}:{line}({name})",
+                    "calls": calls,
+                    "time": inline,
+                    "cumulative": cumulative,
+                }
+                for (file, line, name), (_, calls, inline, cumulative, _) in functions[
+                    :top
+                ]
+            ]
+
+        return report
+
+    def write(self, directory: str) -> str | None:
+        """
+        Write the report as JSON, and the cProfile statistics if collected.
+
+        :param directory: Output directory.
+
+        :return: Path to the JSON report, or None if disabled.
+        """
+        if not self.enabled:
+            return None
+
+        stem = Path(directory) / f"profile{time():.3f}"
+        if self._profile is not None:
+            self._profile.dump_stats(f"{stem}.prof")
+
+        with open(f"{stem}.json", "w", encoding="utf-8") as file:
+            json.dump(self.report(), file, indent=4)
+
+        return f"{stem}.json"
+
+
+class _Stage:
+    """Timing of a stage, with the peak memory if traced."""
+
+    def __init__(self, profiler: Profiler, name: str):
+        self.profiler = profiler
+        self.record: dict = {"name": name}
+        self._start = 0.0
+
+    def __enter__(self):
+        if "memory" in self.profiler.options:
+            import tracemalloc
+
+            tracemalloc.reset_peak()
+
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.record["seconds"] = perf_counter() - self._start
+
+        if "memory" in self.profiler.options:
+            import tracemalloc
+
+            self.record["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 1e6
+
+        self.profiler.stages.append(self.record)
+
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
@@ -0,0 +1,90 @@
+"""
+Ordering of locations along space-filling curves.
+
+Locations close along a Morton (Z-order) or Hilbert curve are close in space, so that
+sorting sources and receivers by their key keeps neighbouring points together in
+memory. Keys are computed on the horizontal coordinates, quantized on a regular grid
+of 2^bits cells along each axis over the extent of the locations.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+
+def quantize(locations: np.ndarray, bits: int) -> tuple[np.ndarray, np.ndarray]:
+    """Integer cell indices (x, y) of locations on a grid of 2^bits cells per axis."""
+    low = locations[:, :2].min(axis=0)
+    extent = np.ptp(locations[:, :2], axis=0)
+    extent[extent == 0] = 1.0
+    cells = (locations[:, :2] - low) / extent * (2**bits - 1)
+
+    return cells[:, 0].astype(np.int64), cells[:, 1].astype(np.int64)
+
+
+def morton_keys(locations: np.ndarray, bits: int = 16) -> np.ndarray:
+    """
+    Morton keys of locations, interleaving the bits of the x and y cell indices.
+
+    :param locations: Array of locations, shape(n, 3).
+    :param bits: Number of bits of the cell indices along each axis.
+
+    :return: Array of keys, shape(n,).
+    """
+    x, y = quantize(locations, bits)
+    keys = np.zeros(locations.shape[0], dtype=np.int64)
+    for bit in range(bits):
+        keys |= ((x >> bit) & 1) << (2 * bit)
+        keys |= ((y >> bit) & 1) << (2 * bit + 1)
+
+    return keys
+
+
+def hilbert_keys(locations: np.ndarray, bits: int = 16) -> np.ndarray:
+    """
+    Distance of locations along a Hilbert curve through the cells.
+
+    :param locations: Array of locations, shape(n, 3).
+    :param bits: Number of bits of the cell indices along each axis.
+
+    :return: Array of keys, shape(n,).
+    """
+    x, y = quantize(locations, bits)
+    keys = np.zeros(locations.shape[0], dtype=np.int64)
+    side = 2**bits
+
+    for level in range(bits - 1, -1, -1):
+        size = 1 << level
+        r_x = (x & size) > 0
+        r_y = (y & size) > 0
+        keys += size * size * ((3 * r_x) ^ r_y)
+
+        # Rotate the quadrant, so that the curve is continuous between cells
+        flip = ~r_y & r_x
+        x = np.where(flip, side - 1 - x, x)
+        y = np.where(flip, side - 1 - y, y)
+        x, y = np.where(~r_y, y, x), np.where(~r_y, x, y)
+
+    return keys
+
+
+def space_filling_order(locations: np.ndarray, curve: str = "hilbert") -> np.ndarray:
+    """
+    Permutation sorting locations along a space-filling curve.
+
+    :param locations: Array of locations, shape(n, 3).
+    :param curve: Type of curve, 'morton' or 'hilbert'.
+
+    :return: Array of indices, shape(n,).
+    """
+    if curve == "morton":
+        keys = morton_keys(locations)
+    elif curve == "hilbert":
+        keys = hilbert_keys(locations)
+    else:
+        raise ValueError("Curve should be one of 'morton' or 'hilbert'.")
+
+    return np.argsort(keys, kind="stable")
+
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
@@ -0,0 +1,148 @@
+"""
+Cache of parsed and validated ui.json files for repeated launches of an application.
+
+Entries are keyed by the sha256 of the ui.json content and by the modification time
+of the geoh5 file it points to. Within a process, a cache hit returns the previously
+resolved data directly. Across processes, a hit skips the validation of the data
+while the entities are still resolved against the geoh5. Files pointing to a missing
+geoh5 are never served from cache.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+_default_cache_file = Path(tempfile.gettempdir()) / "python-training" / "ui_json.json"
+
+
+class InputFileCache:
+    """
+    Cache of InputFile data keyed by file content and workspace modification time.
+
+    :param cache_file: JSON file recording the ui.json files already validated.
+    """
+
+    def __init__(self, cache_file: str | Path | None = None):
+        self.cache_file = Path(cache_file or _default_cache_file)
+        self._data: dict[str, tuple[int, dict]] = {}
+        self._records: dict | None = None
+
+    @property
+    def records(self) -> dict:
+        """Validated ui.json files, with the time it took to load them."""
+        if self._records is None:
+            try:
+                with open(self.cache_file, encoding="utf-8") as file:
+                    self._records = json.load(file)
+            except (OSError, ValueError):
+                self._records = {}
+
+        return self._records
+
+    @staticmethod
+    def stamp(file: str) -> tuple[str, int | None]:
+        """
+        Compute the key of a ui.json file.
+
+        :param file: Path to a ui.json file.
+
+        :return: Sha256 of the file content and modification time (ns) of its geoh5,
+            or None if the geoh5 is not found. Relative paths are resolved against the
+            directory of the ui.json file.
+        """
+        with open(file, "rb") as ui_json:
+            content = ui_json.read()
+
+        geoh5 = json.loads(content).get("geoh5")
+        try:
+            mtime = (Path(file).parent / geoh5).stat().st_mtime_ns if geoh5 else None
+        except (OSError, TypeError):
+            mtime = None
+
+        return hashlib.sha256(content).hexdigest(), mtime
+
+    def read_ui_json(self, file: str) -> dict:
+        """
+        Read, validate and resolve the data of a ui.json file, or get it from cache.
+
+        :param file: Path to a ui.json file.
+
+        :return: Data of the InputFile.
+        """
+        from geoh5py.ui_json import InputFile
+
+        start = perf_counter()
+        key, mtime = self.stamp(file)
+
+        if mtime is None:
+            # Nothing to compare with, the workspace may have changed
+            return InputFile.read_ui_json(file).data
+
+        if key in self._data and self._data[key][0] == mtime:
+            data = self._data[key][1]
+        else:
+            record = self.records.get(key)
+            validated = record is not None and record["mtime"] == mtime
+            options = {"disabled": True} if validated else None
+            data = InputFile.read_ui_json(file, validation_options=options).data
+            self._data[key] = (mtime, data)
+
+            if not validated:
+                self._write_record(key, mtime, perf_counter() - start)
+                return data
+
+        saved = self.records[key]["seconds"] - (perf_counter() - start)
+        print(f"ui.json cache hit for {file}: saved {max(saved, 0.0):.3f} s")
+
+        return data
+
+    def update(self, file: str):
+        """
+        Record the current state of the workspace after a run wrote to it.
+
+        The entities referenced by the ui.json are unchanged by the run, so the
+        cached data remains valid for the new workspace modification time.
+
+        :param file: Path to the ui.json file used for the run.
+        """
+        key, mtime = self.stamp(file)
+
+        if mtime is None:
+            return
+
+        if key in self._data:
+            self._data[key] = (mtime, self._data[key][1])
+
+        if key in self.records:
+            self._write_record(key, mtime, self.records[key]["seconds"])
+
+    def _write_record(self, key: str, mtime: int, seconds: float):
+        """
+        Record a validated ui.json file.
+
+        The cache file is shared by concurrent processes, so it is written to a
+        temporary file first and then replaced atomically.
+        """
+        self.records[key] = {"mtime": mtime, "seconds": seconds}
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            descriptor, temp_file = tempfile.mkstemp(
+                dir=self.cache_file.parent, suffix=".tmp"
+            )
+        except OSError:
+            return
+
+        try:
+            with open(descriptor, "w", encoding="utf-8") as file:
+                json.dump(self.records, file, indent=4)
+            Path(temp_file).replace(self.cache_file)
+        except OSError:
+            os.remove(temp_file)
+
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
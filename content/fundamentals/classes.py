@@ -148,7 +148,7 @@ class Assay2:
     def threshold(self) -> float:
         """Cutoff value for anomalous assays."""
 
-        return self.threshold
+        return self._threshold
 
     @threshold.setter
     def threshold(self, value):
@@ -181,4 +181,107 @@ assay = Assay2(grades, depths)
 assay.threshold = 2.0
 # -
 
+# ## Caching results
+#
+# Every call to `assay()` re-computes `anomalous()` and `get_depths()` from scratch, even if nothing changed since the
+# last call. For long assays queried many times, we can instead store (cache) the results on the class and only
+# re-compute them when one of the inputs changes.
+#
+# Since every change must go through a `setter`, the setters are the natural place to forget (invalidate) the
+# results computed with the old values.
+
+
+# + tags=["clear-form"]
+class Assay3:
+    """Assay class with cached results."""
+
+    def __init__(self, arg_1: list, arg_2: list, threshold: float = 1.0):
+        self._anomalous = None
+        self._anomalous_depths = None
+        self.grades = arg_1
+        self.depths = arg_2
+        self.threshold = threshold
+
+    def anomalous(self):
+        """
+        Find the elements of a list above threshold
+        """
+        if self._anomalous is None:
+            self._anomalous = [val > self.threshold for val in self.grades]
+
+        return list(self._anomalous)
+
+    def get_depths(self):
+        """
+        Extract interval of values from bool logic
+        """
+        if self._anomalous_depths is None:
+            self._anomalous_depths = [
+                val for val, cond in zip(self.depths, self.anomalous()) if cond
+            ]
+
+        return list(self._anomalous_depths)
+
+    def clear_cache(self):
+        """Forget the results computed with previous values."""
+        self._anomalous = None
+        self._anomalous_depths = None
+
+    @property
+    def grades(self) -> tuple:
+        """Assay values."""
+        return self._grades
+
+    @grades.setter
+    def grades(self, values: list):
+        self._grades = tuple(values)
+        self.clear_cache()
+
+    @property
+    def depths(self) -> tuple:
+        """Depth of the assay values."""
+        return self._depths
+
+    @depths.setter
+    def depths(self, values: list):
+        self._depths = tuple(values)
+        self.clear_cache()
+
+    @property
+    def threshold(self) -> float:
+        """Cutoff value for anomalous assays."""
+        return self._threshold
+
+    @threshold.setter
+    def threshold(self, value):
+        if not isinstance(value, float):
+            raise ValueError("The value for threshold must be a float.")
+
+        self._threshold = value
+        self.clear_cache()
+
+    def __call__(self):
+        return self.get_depths()
+
+
+# -
+
+# A few things to note:
+#
+# - The results are stored in the private attributes `_anomalous` and `_anomalous_depths`, with `None` meaning "not
+# computed yet".
+#
+# - The `grades` and `depths` are stored as `tuple`, which cannot be modified in place. Changing the data is only
+# possible by assigning new values, which goes through the setters and clears the cache.
+#
+# - Copies of the cached lists are returned, so that modifying a result outside the class does not corrupt the cache.
+
+# + tags=["clear-form"]
+assay = Assay3(grades, depths)
+print(assay())  # Computed
+print(assay())  # From cache
+assay.threshold = 2.0
+print(assay())  # Re-computed with the new threshold
+# -
+
 #  Copyright (c) 2022 Mira Geoscience Ltd.
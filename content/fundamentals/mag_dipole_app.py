@@ -374,6 +374,68 @@ for label in ["moments", "inclination", "declination"]:
     mag_ui[label]["property"] = ""
 # -
 
+# The application provided in the `assets` folder goes a bit further than this tutorial. Its ui.json has forms for
+# a few more options:
+#
+# - `Bool` to write a report of the time spent in each stage of a run
+# - `Bool` to also compute the gradient tensor and the analytic signal of the TMI
+# - `Data` or `float` values for Earth's field inclination and declination angles, varying between receivers
+# - Optional `Data` of magnetic susceptibility, magnetizing the dipoles by induction instead of the moments and angles,
+#   with the `Data` or `float` volume of the dipoles and the `Float` intensity of Earth's field
+
+# + tags=["clear-form"]
+mag_ui["profile"] = templates.bool_parameter(main=False, label="Profile run")
+mag_ui["profile"]["tooltip"] = (
+    "Write a report of the time spent in each stage to the monitoring directory"
+)
+mag_ui["gradients"] = templates.bool_parameter(label="Gradient tensor")
+mag_ui["gradients"]["tooltip"] = (
+    "Also compute the gradient tensor components and the analytic signal of the TMI"
+)
+
+for label in ["earth_inc", "earth_dec"]:
+    mag_ui[label].update(
+        {
+            "association": ["Vertex", "Cell"],
+            "dataType": "Float",
+            "parent": "receivers",
+            "isValue": True,
+            "property": "",
+        }
+    )
+
+mag_ui["susceptibility"] = templates.data_parameter(
+    label="Susceptibility (SI)",
+    association=["Vertex", "Cell"],
+    parent="sources",
+    optional="disabled",
+)
+mag_ui["susceptibility"]["tooltip"] = (
+    "Magnetize the dipoles by induction, replacing the moment and angles"
+)
+mag_ui["volume"] = templates.data_parameter(
+    label="Dipole volume",
+    association=["Vertex", "Cell"],
+    parent="sources",
+    value=1.0,
+    optional="disabled",
+)
+mag_ui["volume"]["tooltip"] = (
+    "Volume of the dipoles magnetized by induction, "
+    "from the cells of block models if disabled"
+)
+mag_ui["earth_strength"] = templates.float_parameter(
+    label="Earth's field Intensity (nT)", value=50000.0, vmax=100000.0, precision=1
+)
+
+for label in ["volume", "earth_strength"]:
+    mag_ui[label]["dependency"] = "susceptibility"
+    mag_ui[label]["dependencyType"] = "enabled"
+
+mag_ui["volume"]["isValue"] = True
+mag_ui["volume"]["property"] = ""
+# -
+
 # We now need tell which "program" that ANALYST can call.
 
 # + tags=["clear-form"]
@@ -48,7 +48,7 @@ my_ui
 # + tags=["clear-form"]
 import json
 
-with open("../assets/myUI.ui.json", "w", encoding="utf-8") as file:
+with open("../../assets/myUI.ui.json", "w", encoding="utf-8") as file:
     json.dump(my_ui, file, indent=4)
 # -
 
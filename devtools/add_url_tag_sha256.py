@@ -14,51 +14,92 @@ Usage: at the root of the project:
 > python devtools/add_url_tag_sha256.py
 """
 
+from __future__ import annotations
+
 import hashlib
+import json
 import re
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from urllib import request
 
 _url_filename_re = re.compile(".*/([^/]*)")
+_chunk_size = 1 << 20
+_cache_file = Path(".url_sha256_cache.json")
+
+
+def computeSha256(url: str, base_name: str = None, cache: dict = None) -> str:
+    """
+    Hash the content of a URL while downloading it, in chunks of fixed size.
 
+    :param url: URL to download.
+    :param base_name: Name prefixed to the file name in messages.
+    :param cache: Map of URL to sha256, used and updated if provided.
+    """
+    if cache is not None and url in cache:
+        return cache[url]
 
-def computeSha256(url: str, base_name: str = None) -> str:
     filename = _url_filename_re.match(url).group(1)
     if base_name:
         filename = f"{base_name}-{filename}"
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        copy = Path(tmpdirname) / filename
-        print(f"# Fetching {url} ...")
-        request.urlretrieve(url, str(copy))
-        with open(copy, "rb") as f:
-            f_byte = f.read()
-            sha256 = hashlib.sha256(f_byte)
-            return sha256.hexdigest()
+    print(f"# Fetching {url} ({filename}) ...")
+    sha256 = hashlib.sha256()
+    with request.urlopen(url) as response:
+        for chunk in iter(lambda: response.read(_chunk_size), b""):
+            sha256.update(chunk)
+
+    if cache is not None:
+        cache[url] = sha256.hexdigest()
+
+    return sha256.hexdigest()
+
 
+def load_cache() -> dict:
+    try:
+        with open(_cache_file, encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
 
-def patchPyprojectToml():
+
+def save_cache(cache: dict):
+    with open(_cache_file, "w", encoding="utf-8") as file:
+        json.dump(cache, file, indent=4, sort_keys=True)
+
+
+def patchPyprojectToml(max_workers: int = 4):
     pyproject = Path("pyproject.toml")
     assert pyproject.is_file()
 
     tag_url_re = re.compile(
         r"""^(\s*\w*\s*=\s*{\s*url\s*=\s*)"(.*/archive/refs/tags/.*)#sha256=\w*"(.*}.*)"""
     )
+    with open(pyproject) as input:
+        lines = list(input)
+
+    matches = [tag_url_re.match(line) for line in lines]
+    cache = load_cache()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        shas = pool.map(
+            lambda match: computeSha256(
+                match.group(2), match.group(1).strip(), cache=cache
+            ),
+            [match for match in matches if match],
+        )
+    save_cache(cache)
+
     pyproject_sha = Path("pyproject-sha.toml")
     with open(pyproject_sha, "w") as patched:
-        with open(pyproject) as input:
-            for line in input:
-                match = tag_url_re.match(line)
-                if not match:
-                    patched.write(line)
-                else:
-                    line_start = match.group(1)
-                    package_name = line_start.strip()
-                    url = match.group(2)
-                    line_end = match.group(3)
-                    sha = computeSha256(url, package_name)
-                    patched_line = f"""{line_start}"{url}#sha256={sha}"{line_end}\n"""
-                    patched.write(patched_line)
+        for line, match in zip(lines, matches):
+            if not match:
+                patched.write(line)
+            else:
+                line_start = match.group(1)
+                url = match.group(2)
+                line_end = match.group(3)
+                sha = next(shas)
+                patched_line = f"""{line_start}"{url}#sha256={sha}"{line_end}\n"""
+                patched.write(patched_line)
 
     pyproject_sha.replace(pyproject)
 
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
+#
+#  This file is part of python-training.
+
+"""
+Benchmark the dipole forward model of mag_dipole_app across problem sizes.
+
+Synthetic sources and receivers are drawn within the extent of the SunCity grid, for
+10^2 to 10^7 source-receiver pairs. Each case runs in a new process to record its wall
+time, peak resident memory and throughput (source-receiver pairs per second).
+Results are appended to a JSON lines file, tagged with the current git commit, and
+compared with the last results recorded for a different commit.
+
+Usage: at the root of the project:
+> python devtools/benchmark_dipole.py [--cases b_field tmi_projection] [--max-pairs 1e6]
+> python devtools/benchmark_dipole.py --cases dipole_fields dipole_fields_hilbert
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+from multiprocessing import get_context
+from pathlib import Path
+from time import perf_counter
+
+_assets_folder = Path("assets")
+_results_file = Path("benchmarks") / "dipole.jsonl"
+
+sys.path.append(str(_assets_folder))
+
+SIZES = [10**power for power in range(2, 8)]
+
+
+def suncity_extent() -> tuple:
+    """Bounding box (x_min, x_max, y_min, y_max, z) of the SunCity grid."""
+    from geoh5py.workspace import Workspace
+
+    with Workspace(str(_assets_folder / "suncity.geoh5"), mode="r") as workspace:
+        centroids = workspace.get_entity("SunCity")[0].centroids
+
+    return (
+        centroids[:, 0].min(),
+        centroids[:, 0].max(),
+        centroids[:, 1].min(),
+        centroids[:, 1].max(),
+        centroids[:, 2].mean(),
+    )
+
+
+def synthetic_survey(pairs: int, extent: tuple, seed: int = 0):
+    """
+    Draw random sources below, and receivers on, the SunCity grid.
+
+    The number of sources grows with the cube root of the number of pairs.
+
+    :param pairs: Number of source-receiver pairs.
+    :param extent: Bounding box (x_min, x_max, y_min, y_max, z) of the grid.
+    :param seed: Seed of the random generator.
+
+    :return: Arrays of source and receiver locations, shape(n, 3).
+    """
+    import numpy as np
+
+    n_sources = 10 ** (int(np.log10(pairs)) // 3)
+    n_receivers = pairs // n_sources
+    rng = np.random.default_rng(seed)
+
+    def draw(count, depth):
+        return np.c_[
+            rng.uniform(extent[0], extent[1], count),
+            rng.uniform(extent[2], extent[3], count),
+            extent[4] - rng.uniform(*depth, count),
+        ]
+
+    return draw(n_sources, (100.0, 500.0)), draw(n_receivers, (0.0, 0.0))
+
+
+def bench_b_field(sources, receivers):
+    from mag_dipole_app import b_field
+
+    for source in sources:
+        b_field(source, receivers, 1e6, -62.11, -17.9)
+
+
+def bench_tmi_projection(sources, receivers):
+    import numpy as np
+    from mag_dipole_app import tmi_projection
+
+    fields = np.ones_like(receivers)
+    for _ in sources:
+        tmi_projection(fields, (-62.11, -17.9))
+
+
+def bench_dipole_fields(sources, receivers, order=None):
+    import numpy as np
+    from mag_dipole_app import dipole_fields, inclination_declination_2_xyz
+    from space_filling import space_filling_order
+
+    if order is not None:
+        sources = sources[space_filling_order(sources, order)]
+        receivers = receivers[space_filling_order(receivers, order)]
+
+    moments = 1e6 * inclination_declination_2_xyz(-62.11, -17.9)
+    dipole_fields(sources, receivers, np.repeat(moments, len(sources), axis=0))
+
+
+def bench_magnetic_simulator(sources, receivers, order=None):
+    from geoh5py.objects import Points
+    from geoh5py.workspace import Workspace
+    from mag_dipole_app import magnetic_simulator
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        with Workspace(str(Path(tmpdirname) / "bench.geoh5")) as workspace:
+            magnetic_simulator(
+                Points.create(workspace, vertices=sources),
+                Points.create(workspace, vertices=receivers),
+                1e6,
+                -62.11,
+                -17.9,
+                -62.11,
+                -17.9,
+                order=order,
+            )
+
+
+CASES = {
+    "b_field": bench_b_field,
+    "tmi_projection": bench_tmi_projection,
+    "dipole_fields": bench_dipole_fields,
+    "magnetic_simulator": bench_magnetic_simulator,
+}
+
+# Sources and receivers sorted along space-filling curves, sorting included
+for _curve in ("morton", "hilbert"):
+    CASES[f"dipole_fields_{_curve}"] = partial(bench_dipole_fields, order=_curve)
+    CASES[f"magnetic_simulator_{_curve}"] = partial(
+        bench_magnetic_simulator, order=_curve
+    )
+
+
+def peak_rss() -> float | None:
+    """Peak resident memory (MB) of the current process, if available."""
+    try:
+        import resource
+
+        scale = 1.0 if sys.platform == "darwin" else 1024.0
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+    except ImportError:
+        pass
+
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().peak_wset / 1e6
+    except (ImportError, AttributeError):
+        return None
+
+
+def run_case(name: str, pairs: int, extent: tuple, repeat: int) -> dict:
+    """
+    Time a benchmark case on a synthetic survey, keeping the best of repeats.
+
+    :param name: Name of the case in CASES.
+    :param pairs: Number of source-receiver pairs.
+    :param extent: Bounding box of the survey.
+    :param repeat: Number of repeats.
+
+    :return: Timing, memory and throughput of the case.
+    """
+    sources, receivers = synthetic_survey(pairs, extent)
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        CASES[name](sources, receivers)
+        times.append(perf_counter() - start)
+
+    wall = min(times)
+    return {
+        "case": name,
+        "pairs": pairs,
+        "sources": len(sources),
+        "receivers": len(receivers),
+        "wall": wall,
+        "peak_rss_mb": peak_rss(),
+        "pairs_per_second": pairs / wall,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_previous(commit: str | None) -> dict:
+    """Results of the last run recorded for a different commit, keyed by case and size."""
+    previous = {}
+    if _results_file.exists():
+        with open(_results_file, encoding="utf-8") as file:
+            for line in file:
+                record = json.loads(line)
+                if record["commit"] != commit:
+                    previous = {
+                        (result["case"], result["pairs"]): result
+                        for result in record["results"]
+                    }
+
+    return previous
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the dipole forward model across problem sizes."
+    )
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--max-pairs", type=float, default=SIZES[-1])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="Relative slowdown reported as a regression.",
+    )
+    args = parser.parse_args()
+
+    commit = git_commit()
+    previous = load_previous(commit)
+    extent = suncity_extent()
+
+    results = []
+    for name in args.cases:
+        for pairs in [size for size in SIZES if size <= args.max_pairs]:
+            # New process per case for a meaningful peak memory
+            with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+                result = pool.submit(
+                    run_case, name, pairs, extent, args.repeat
+                ).result()
+
+            results.append(result)
+            message = (
+                f"-- {name} {pairs:.0e} pairs: {result['wall']:.4f} s, "
+                f"{result['pairs_per_second']:.3e} pairs/s, "
+                f"peak RSS {result['peak_rss_mb'] or float('nan'):.0f} MB"
+            )
+            if (name, pairs) in previous:
+                ratio = result["wall"] / previous[(name, pairs)]["wall"]
+                flag = " REGRESSION" if ratio > 1 + args.tolerance else ""
+                message += f" ({ratio:.2f}x previous){flag}"
+            print(message)
+
+    _results_file.parent.mkdir(exist_ok=True)
+    with open(_results_file, "a", encoding="utf-8") as file:
+        record = {
+            "commit": commit,
+            "date": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results,
+        }
+        file.write(json.dumps(record) + "\n")
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
+#
+#  This file is part of python-training.
+
+"""
+Benchmark the cold start of a small mag_dipole_app run, end to end.
+
+``python mag_dipole_app.py file.ui.json`` is timed in new interpreters, as launched by
+ANALYST on every run, for the working tree and for a baseline revision of the assets.
+The run simulates 10 dipoles on 100 receivers of a synthetic workspace, restored before
+each run, so that its wall time is dominated by the interpreter start-up and the
+imports. The heaviest imports are reported from ``python -X importtime``.
+
+Two floors bound the achievable speed-up: an empty interpreter, and the import of
+numpy and geoh5py, needed by any run.
+
+Usage: at the root of the project:
+> python devtools/benchmark_startup.py --baseline REVISION [--repeat 5] [--top 10]
+
+where REVISION is any git revision of the assets to compare with, e.g. the merge-base
+with the main branch: ``--baseline $(git merge-base HEAD origin/main)``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+_assets_folder = Path("assets")
+_importtime_re = re.compile(r"^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)")
+
+FLOORS = {
+    "interpreter": ["-c", "pass"],
+    "numpy+geoh5py": ["-c", "import numpy, geoh5py.ui_json.utils"],
+}
+
+
+def synthetic_ui_json(folder: Path) -> Path:
+    """
+    Write a small workspace and the ui.json of a run on it.
+
+    :param folder: Directory of the files.
+
+    :return: Path to the ui.json file.
+    """
+    import numpy as np
+    from geoh5py.objects import Points
+    from geoh5py.workspace import Workspace
+
+    rng = np.random.default_rng(0)
+    geoh5 = folder / "pristine.geoh5"
+    with Workspace(str(geoh5)) as workspace:
+        entities = {
+            "sources": Points.create(
+                workspace, vertices=rng.uniform(0.0, 100.0, (10, 3)) - [0, 0, 200]
+            ),
+            "receivers": Points.create(
+                workspace, vertices=rng.uniform(0.0, 100.0, (100, 3))
+            ),
+        }
+
+    with open(_assets_folder / "magnetic_dipole.ui.json", encoding="utf-8") as file:
+        ui_json = json.load(file)
+
+    ui_json["geoh5"] = str(folder / "startup.geoh5")
+    for name, entity in entities.items():
+        ui_json[name]["value"] = f"{{{entity.uid}}}"
+
+    file = folder / "startup.ui.json"
+    with open(file, "w", encoding="utf-8") as output:
+        json.dump(ui_json, output, indent=4)
+
+    return file
+
+
+def checkout_assets(revision: str, folder: Path) -> Path:
+    """
+    Write the python modules of the assets at a git revision to a folder.
+
+    :param revision: Git revision.
+    :param folder: Directory of the modules.
+
+    :return: Path to the entry point.
+    """
+    names = subprocess.run(
+        ["git", "ls-tree", "--name-only", revision, f"{_assets_folder.as_posix()}/"],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout.split()
+
+    folder.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        if name.endswith(".py"):
+            source = subprocess.run(
+                ["git", "show", f"{revision}:{name}"],
+                capture_output=True,
+                check=True,
+            ).stdout
+            (folder / Path(name).name).write_bytes(source)
+
+    return folder / "mag_dipole_app.py"
+
+
+def import_times(arguments: list[str], cwd: Path) -> tuple[float, dict[str, int]]:
+    """
+    Run python with ``-X importtime`` in a new interpreter.
+
+    :param arguments: Arguments of the interpreter.
+    :param cwd: Working directory of the process.
+
+    :return: Wall time (s) of the process and cumulative import time (us) of the
+        top-level modules.
+    """
+    start = perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime"] + arguments,
+        cwd=cwd,
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    wall_time = perf_counter() - start
+
+    modules = {}
+    for line in process.stderr.splitlines():
+        match = _importtime_re.match(line)
+        if match and len(match.group(3)) <= 1:
+            modules[match.group(4)] = int(match.group(2))
+
+    return wall_time, modules
+
+
+def benchmark(
+    arguments: list[str], cwd: Path, repeat: int = 5, workspace: Path | None = None
+) -> dict:
+    """
+    Repeat the cold start of a process and collect the median timings.
+
+    :param arguments: Arguments of the interpreter.
+    :param cwd: Working directory of the process.
+    :param repeat: Number of new interpreters to start.
+    :param workspace: Folder of a synthetic workspace, restored before each run.
+
+    :return: Median wall time (s), median import time (s) and the modules sorted by
+        decreasing import time (us) of the last run.
+    """
+    wall_times, totals = [], []
+    for _ in range(repeat):
+        if workspace is not None:
+            shutil.copyfile(workspace / "pristine.geoh5", workspace / "startup.geoh5")
+
+        wall_time, modules = import_times(arguments, cwd)
+        wall_times.append(wall_time)
+        totals.append(sum(modules.values()) * 1e-6)
+
+    return {
+        "wall": statistics.median(wall_times),
+        "import": statistics.median(totals),
+        "modules": sorted(modules.items(), key=lambda item: -item[1]),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the cold start of a small mag_dipole_app run."
+    )
+    parser.add_argument(
+        "--baseline", required=True, help="Git revision of the baseline assets."
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        ui_json = synthetic_ui_json(Path(tmpdirname))
+        baseline = checkout_assets(args.baseline, Path(tmpdirname) / "baseline")
+        cases = {
+            **{name: (arguments, _assets_folder) for name, arguments in FLOORS.items()},
+            args.baseline: ([baseline.name, str(ui_json)], baseline.parent),
+            "working tree": (["mag_dipole_app.py", str(ui_json)], _assets_folder),
+        }
+
+        results = {}
+        for name, (arguments, cwd) in cases.items():
+            results[name] = benchmark(
+                arguments, cwd, args.repeat, workspace=ui_json.parent
+            )
+            print(
+                f"-- {name}: wall time {results[name]['wall']:.3f} s, "
+                f"import time {results[name]['import']:.3f} s"
+            )
+            for module, cumulative in results[name]["modules"][: args.top]:
+                print(f"   {cumulative * 1e-3:9.1f} ms  {module}")
+
+    reference = results[args.baseline]["wall"]
+    print(
+        f"-- Cold start speed-up of a small run: "
+        f"{reference / results['working tree']['wall']:.2f}x, at most "
+        f"{reference / results['numpy+geoh5py']['wall']:.2f}x with numpy and geoh5py"
+    )
@@ -17,10 +17,10 @@ To prepare the conda base environment, see devtools/setup-conda-base.bat
 """
 
 import argparse
-import re
 from pathlib import Path
 
 from add_url_tag_sha256 import computeSha256
+from lock_file_patcher import MoveAfter, patch_lock_file
 from run_conda_lock import per_platform_env
 
 _archive_ext = ".tar.gz"
@@ -54,25 +54,19 @@ def create_standalone_lock(git_url: str, full: bool, suffix=""):
 
 def add_geoapps(git_url: str, lock_file: Path, output_file: Path):
     print(f"# Patching {lock_file} for standalone environment ...")
-    pip_dependency_re = re.compile(r"^\s*- (geoh5py|simpeg|simpeg-archive) @")
-    pip_dependency_lines = []
-    with open(lock_file) as input:
-        for line in input:
-            if pip_dependency_re.match(line):
-                pip_dependency_lines.append(line)
-
-    pip_section_re = re.compile(r"^\s*- pip:\s*$")
     geoapps_pip = f"    - geoapps @ {git_url}\n"
     print(f"# Patched file: {output_file}")
-    with open(output_file, "w") as patched:
-        with open(lock_file) as input:
-            for line in input:
-                if not pip_dependency_re.match(line):
-                    patched.write(line)
-                if pip_section_re.match(line):
-                    for pip_line in pip_dependency_lines:
-                        patched.write(pip_line)
-                    patched.write(geoapps_pip)
+    patch_lock_file(
+        lock_file,
+        [
+            MoveAfter(
+                r"^\s*- (geoh5py|simpeg|simpeg-archive) @",
+                r"^\s*- pip:\s*$",
+                extra=[geoapps_pip],
+            )
+        ],
+        output=output_file,
+    )
 
 
 def build_git_url(args) -> str:
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
+#
+#  This file is part of python-training.
+
+"""
+Execute the notebooks of the book into the jupyter-cache used by jupyter-book.
+
+Notebooks listed in the table of contents are executed only if stale: their code
+changed, or one of the assets they reference (``assets/...`` paths in the code
+cells) changed since their last execution. Notebooks sharing assets run one after
+the other in the same worker, while independent ones run in parallel kernels.
+
+With ``execute_notebooks: cache`` in ``content/_config.yml``, the book build then
+reuses the cached outputs instead of executing the notebooks again.
+
+Usage: from the project base folder, after ``python devtools/update_tutorials.py ipynb``
+
+> python devtools/execute_notebooks.py [max_workers]
+> jupyter-book build content/
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+BOOK = Path("content")
+CACHE = BOOK / "_build" / ".jupyter_cache"
+
+ASSET_PATTERN = re.compile(r"[\w./\\-]*assets[/\\][\w.-]+")
+
+
+def toc_notebooks(book: Path = BOOK) -> list[Path]:
+    """List the notebooks of the table of contents of the book."""
+    import yaml
+
+    with open(book / "_toc.yml", encoding="utf-8") as file:
+        toc = yaml.safe_load(file)
+
+    def files(entry):
+        if isinstance(entry, dict):
+            if "file" in entry:
+                yield entry["file"]
+            for value in entry.values():
+                yield from files(value)
+        elif isinstance(entry, list):
+            for value in entry:
+                yield from files(value)
+
+    notebooks = [book / toc["root"]] + [book / name for name in files(toc)]
+    return [
+        path.with_suffix(".ipynb")
+        for path in notebooks
+        if path.with_suffix(".ipynb").exists()
+    ]
+
+
+def read_notebook(path: Path):
+    import nbformat
+
+    return nbformat.read(str(path), as_version=4)
+
+
+def notebook_assets(path: Path, notebook) -> list[Path]:
+    """Files referenced as assets in the code cells of a notebook."""
+    assets = set()
+    for cell in notebook.cells:
+        if cell.cell_type != "code":
+            continue
+        for name in ASSET_PATTERN.findall(cell.source):
+            assets.add((path.parent / name).resolve())
+
+    return sorted(assets)
+
+
+def assets_hash(assets: list[Path]) -> str:
+    """Hash of the content of assets, in chunks. Missing files hash as empty."""
+    digest = hashlib.sha256()
+    for asset in assets:
+        digest.update(str(asset).encode())
+        if asset.is_file():
+            with open(asset, "rb") as file:
+                for chunk in iter(lambda f=file: f.read(2**20), b""):
+                    digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def group_notebooks(assets: dict[Path, list[Path]]) -> list[list[Path]]:
+    """
+    Group the notebooks sharing assets, so that they run sequentially.
+
+    :param assets: Referenced assets of each notebook, in order of execution.
+    """
+    groups: list[tuple[set, list[Path]]] = []
+    for notebook, files in assets.items():
+        files = set(files)
+        shared = [group for group in groups if group[0] & files]
+        for group in shared:
+            groups.remove(group)
+            files |= group[0]
+
+        merged = [name for group in shared for name in group[1]] + [notebook]
+        groups.append((files, sorted(merged, key=list(assets).index)))
+
+    return [notebooks for _, notebooks in groups]
+
+
+def stale(cache, notebooks: dict) -> list[Path]:
+    """
+    Select the notebooks with no cached execution matching their code and assets.
+
+    :param cache: Jupyter cache of the book.
+    :param notebooks: Notebook nodes and referenced assets of each path.
+    """
+    selection = []
+    for path, (notebook, assets) in notebooks.items():
+        try:
+            record = cache.match_cache_notebook(notebook)
+        except KeyError:
+            selection.append(path)
+            continue
+
+        if record.data.get("assets") != assets_hash(assets):
+            selection.append(path)
+
+    return selection
+
+
+def execute_group(paths: list[Path], timeout: int, allow_errors: bool) -> list:
+    """
+    Execute notebooks one after the other, from their own directory.
+
+    :return: List of path, executed notebook, execution time and traceback (or None)
+        for each notebook.
+    """
+    from jupyter_cache.executors.utils import single_nb_execution
+
+    results = []
+    for path in paths:
+        result = single_nb_execution(
+            read_notebook(path),
+            cwd=str(path.parent),
+            timeout=timeout,
+            allow_errors=allow_errors,
+        )
+        results.append((path, result.nb, result.time, result.exc_string))
+
+    return results
+
+
+def execute_notebooks(max_workers: int | None = None, cache_path: Path = CACHE):
+    """
+    Execute the stale notebooks of the book in parallel and store them in the cache.
+
+    :param max_workers: Maximum number of kernels running at once.
+    :param cache_path: Folder of the jupyter cache read by jupyter-book.
+
+    :return: Execution time of each notebook run.
+    """
+    import yaml
+    from jupyter_cache import get_cache
+    from jupyter_cache.base import NbBundleIn
+
+    with open(BOOK / "_config.yml", encoding="utf-8") as file:
+        options = (yaml.safe_load(file) or {}).get("execute", {})
+
+    cache = get_cache(str(cache_path))
+    notebooks = {}
+    for path in toc_notebooks():
+        notebook = read_notebook(path)
+        notebooks[path] = (notebook, notebook_assets(path, notebook))
+
+    selection = stale(cache, notebooks)
+    for path in notebooks:
+        if path not in selection:
+            print(f"Up to date {path}")
+
+    groups = group_notebooks({path: notebooks[path][1] for path in selection})
+    execution_times = {}
+    errors = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                execute_group,
+                group,
+                options.get("timeout", 30),
+                options.get("allow_errors", False),
+            )
+            for group in groups
+        ]
+        for future in as_completed(futures):
+            for path, notebook, seconds, traceback in future.result():
+                execution_times[str(path)] = seconds
+                if traceback is not None:
+                    errors.append(path)
+                    print(f"Failed {path} after {seconds:.1f} s\n{traceback}")
+                    continue
+
+                # Assets are hashed after the whole group ran, as notebooks may
+                # write to them
+                data = {
+                    "assets": assets_hash(notebooks[path][1]),
+                    "execution_seconds": seconds,
+                }
+                cache.cache_notebook_bundle(
+                    NbBundleIn(notebook, str(path.resolve()), data=data),
+                    check_validity=False,
+                    overwrite=True,
+                )
+                print(f"Executed {path} in {seconds:.1f} s")
+
+    if errors:
+        raise RuntimeError(f"Execution failed for {[str(path) for path in errors]}")
+
+    return execution_times
+
+
+if __name__ == "__main__":
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    execute_notebooks(max_workers=workers)
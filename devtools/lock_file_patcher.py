@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
+#
+#  This file is part of python-training.
+
+"""
+Single-pass rewriting of lock files with a list of rules.
+
+Lines stream through each rule in turn, so a file is read once and written once,
+atomically, however many rules are applied.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+
+
+class Rule:
+    """Base rule, passing lines through unchanged."""
+
+    def feed(self, line: str):
+        """Yield the output lines for an input line."""
+        yield line
+
+    def finish(self):
+        """Yield the output lines held back until the end of the file."""
+        return ()
+
+
+class Substitute(Rule):
+    """
+    Replace a regular expression in every line.
+
+    :param pattern: Regular expression to replace.
+    :param replacement: Replacement string, as for :func:`re.sub`.
+    """
+
+    def __init__(self, pattern: str, replacement: str):
+        self.pattern = re.compile(pattern)
+        self.replacement = replacement
+
+    def feed(self, line: str):
+        yield self.pattern.sub(self.replacement, line)
+
+
+class Append(Rule):
+    """
+    Add text at the end of the file.
+
+    :param text: Text to append.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def finish(self):
+        yield self.text
+
+
+class MoveAfter(Rule):
+    """
+    Move the lines matching a pattern right after an anchor line, followed by extra
+    lines. Lines following the anchor are held until the end of the file, so that
+    matching lines found after the anchor are moved too.
+
+    Matching lines are dropped if the anchor is not found.
+
+    :param pattern: Regular expression of the lines to move.
+    :param anchor: Regular expression of the line to insert after.
+    :param extra: Lines inserted after the moved lines.
+    """
+
+    def __init__(self, pattern: str, anchor: str, extra: list[str] | None = None):
+        self.pattern = re.compile(pattern)
+        self.anchor = re.compile(anchor)
+        self.extra = extra or []
+        self.moved: list[str] = []
+        self.held: list[str] | None = None
+
+    def feed(self, line: str):
+        if self.pattern.match(line):
+            self.moved.append(line)
+        elif self.held is not None:
+            self.held.append(line)
+        else:
+            yield line
+            if self.anchor.match(line):
+                self.held = []
+
+    def finish(self):
+        if self.held is not None:
+            yield from self.moved
+            yield from self.extra
+            yield from self.held
+
+
+def apply_rules(lines, rules: list[Rule]):
+    """
+    Stream lines through a chain of rules.
+
+    :param lines: Iterable of input lines.
+    :param rules: Rules applied in order.
+    """
+
+    def chain(line_iter, remaining):
+        for line in line_iter:
+            if not remaining:
+                yield line
+            else:
+                yield from chain(remaining[0].feed(line), remaining[1:])
+
+    yield from chain(lines, rules)
+    for ind, rule in enumerate(rules):
+        yield from chain(rule.finish(), rules[ind + 1 :])
+
+
+def patch_lock_file(file: Path, rules: list[Rule], output: Path | None = None):
+    """
+    Rewrite a lock file with rules, in one read and one atomic write.
+
+    :param file: Lock file to read.
+    :param rules: Rules applied in order.
+    :param output: File to write. The input file is replaced if None.
+
+    The file written keeps the permissions of the file it replaces, or of the input
+    file if new.
+    """
+    output = Path(output or file)
+    descriptor, temp_file = tempfile.mkstemp(dir=output.parent, suffix=".tmp")
+    try:
+        with open(descriptor, "w") as patched:
+            with open(file) as f:
+                patched.writelines(apply_rules(f, rules))
+        shutil.copymode(output if output.exists() else file, temp_file)
+        Path(temp_file).replace(output)
+    except BaseException:
+        os.remove(temp_file)
+        raise
@@ -14,20 +14,27 @@ Cross platform lock files are created at the root of the project.
 Per-platform conda environment files with and without dev dependencies, are placed under the `environments` sub-folder.
 They include an environment file for Python 3.9 with fewer dependencies for simpeg.
 
+Python versions are locked in parallel, and so are their per-platform renders. Lock files are kept
+if `pyproject.toml` and the `env-python-*.yml` files are unchanged since the last run.
+
 Usage: from a the conda base environment, at the root of the project:
 > python devtools/run_conda_lock.py
 
 To prepare the conda base environment, see devtools/setup-conda-base.bat
 """
 
+from __future__ import annotations
+
+import hashlib
+import json
 import os
-import re
 import subprocess
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from pathlib import Path
 
 from add_url_tag_sha256 import patchPyprojectToml
+from lock_file_patcher import Append, Substitute, patch_lock_file
 
 env_file_variables_section_ = """
 variables:
@@ -36,6 +43,11 @@ variables:
 
 _environments_folder = Path("environments")
 
+# Hashes of the inputs of each lock file, and timings of the last run
+_state_file = Path(".conda-lock-state.json")
+
+execution_times: dict[str, float] = {}
+
 
 @contextmanager
 def print_execution_time(name: str = "") -> None:
@@ -48,6 +60,8 @@ def print_execution_time(name: str = "") -> None:
         duration = datetime.now() - start
         message_prefix = f" {name} -" if name else ""
         print(f"--{message_prefix} execution time: {duration}")
+        if name:
+            execution_times[name] = duration.total_seconds()
 
 
 def create_multi_platform_lock(py_ver: str, platform: str = None) -> None:
@@ -70,44 +84,33 @@ def per_platform_env(py_ver: str, full=True, dev=False, suffix="") -> None:
     dev_dep_option = "--dev-dependencies" if dev else "--no-dev-dependencies"
     dev_suffix = "-dev" if dev else ""
     extras_option = "--extras full" if full else ""
-    subprocess.run(
-        (
-            f"conda-lock render {dev_dep_option} {extras_option} -k env"
-            f" --filename-template {_environments_folder}/conda-py-{py_ver}-{{platform}}{dev_suffix}{suffix}.lock conda-py-{py_ver}-lock.yml"
-        ),
-        env=dict(os.environ, PYTHONUTF8="1"),
-        shell=True,
-        check=True,
-        stderr=subprocess.STDOUT,
-    )
+    with print_execution_time(f"conda-lock render for {py_ver}{dev_suffix}{suffix}"):
+        subprocess.run(
+            (
+                f"conda-lock render {dev_dep_option} {extras_option} -k env"
+                f" --filename-template {_environments_folder}/conda-py-{py_ver}-{{platform}}{dev_suffix}{suffix}.lock conda-py-{py_ver}-lock.yml"
+            ),
+            env=dict(os.environ, PYTHONUTF8="1"),
+            shell=True,
+            check=True,
+            stderr=subprocess.STDOUT,
+        )
     platform_glob = "*-64"
     for lock_env_file in _environments_folder.glob(
         f"conda-py-{py_ver}-{platform_glob}{dev_suffix}{suffix}.lock.yml"
     ):
-        patch_none_md5(lock_env_file)
-        with open(lock_env_file, "a") as f:
-            f.write(env_file_variables_section_)
+        patch_lock_file(
+            lock_env_file, [none_md5_rule(), Append(env_file_variables_section_)]
+        )
 
 
-def patch_none_md5(file: Path) -> None:
+def none_md5_rule() -> Substitute:
     """
-    Patch the given file to safely remove --hash=md5:None.
+    Rule to safely remove --hash=md5:None.
 
     pip does not want hash with md5 (but accepts sha256 or others).
     """
-
-    none_md5_re = re.compile(r"(.*)\s--hash=md5:None\b(.*)")
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        patched_file = Path(tmpdirname) / file.name
-        with open(patched_file, "w") as patched:
-            with open(file) as f:
-                for line in f:
-                    match = none_md5_re.match(line)
-                    if not match:
-                        patched.write(line)
-                    else:
-                        patched.write(f"{match.group(1)}{match.group(2)}\n")
-        patched_file.replace(file)
+    return Substitute(r"\s--hash=md5:None\b", "")
 
 
 def config_conda() -> None:
@@ -119,24 +122,82 @@ def config_conda() -> None:
     )
 
 
-def delete_existing_files() -> None:
+def delete_existing_files(py_ver: str = "*") -> None:
     if _environments_folder.exists():
-        for f in _environments_folder.glob("*.lock.yml"):
+        for f in _environments_folder.glob(f"conda-py-{py_ver}-*.lock.yml"):
             f.unlink()
 
-    for f in Path().glob("*-lock.yml"):
+    for f in Path().glob(f"conda-py-{py_ver}-lock.yml"):
         f.unlink()
 
 
+def inputs_hash(py_ver: str) -> str:
+    """Hash of the files defining the lock file of a Python version."""
+    sha256 = hashlib.sha256()
+    for file in [
+        Path("pyproject.toml"),
+        _environments_folder / f"env-python-{py_ver}.yml",
+    ]:
+        sha256.update(file.read_bytes())
+
+    return sha256.hexdigest()
+
+
+def lock_python_version(py_ver: str, hashes: dict) -> None:
+    """
+    Create the lock file of a Python version, then render its per platform
+    environment files in parallel, unless the inputs are unchanged.
+
+    :param py_ver: Python version.
+    :param hashes: Hashes of the inputs of the existing lock files, updated in place.
+    """
+    digest = inputs_hash(py_ver)
+    existing = list(_environments_folder.glob(f"conda-py-{py_ver}-*.lock.yml"))
+    if (
+        hashes.get(py_ver) == digest
+        and Path(f"conda-py-{py_ver}-lock.yml").exists()
+        and existing
+    ):
+        print(f"# Lock files for Python {py_ver} are up to date.")
+        return
+
+    delete_existing_files(py_ver)
+    create_multi_platform_lock(py_ver)
+    with ThreadPoolExecutor() as pool:
+        list(pool.map(lambda dev: per_platform_env(py_ver, dev=dev), [False, True]))
+
+    hashes[py_ver] = digest
+
+
+def run_conda_lock(py_versions: list[str]) -> None:
+    """
+    Lock all Python versions in parallel and record the timing of each stage.
+
+    :param py_versions: Python versions to lock.
+    """
+    try:
+        with open(_state_file, encoding="utf-8") as file:
+            hashes = json.load(file)["hashes"]
+    except (OSError, ValueError, KeyError):
+        hashes = {}
+
+    try:
+        with ThreadPoolExecutor() as pool:
+            for future in [
+                pool.submit(lock_python_version, py_ver, hashes)
+                for py_ver in py_versions
+            ]:
+                future.result()
+    finally:
+        with open(_state_file, "w", encoding="utf-8") as file:
+            json.dump({"hashes": hashes, "timings": execution_times}, file, indent=4)
+
+
 if __name__ == "__main__":
     assert _environments_folder.is_dir()
-    delete_existing_files()
 
     config_conda()
 
     patchPyprojectToml()
     with print_execution_time(f"run_conda_lock"):
-        for py_ver in ["3.9"]:
-            create_multi_platform_lock(py_ver)
-            per_platform_env(py_ver, dev=False)
-            per_platform_env(py_ver, dev=True)
+        run_conda_lock(["3.9"])
@@ -2,15 +2,46 @@
 #
 #  This file is part of python-training.
 
+from __future__ import annotations
+
+import hashlib
+import json
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
 CONVERT = {"ipynb": "py", "py": "ipynb"}
 LOCATION = {"ipynb": os.path.join("content"), "py": os.path.join("content")}
 
+# Content hash of the sources and outputs of the last conversions
+MANIFEST = ".update_tutorials.json"
 
-def update_files(ext):
-    for directory, _, files in os.walk(os.path.join(LOCATION[CONVERT[ext]])):
+
+def sha256(path: str) -> str | None:
+    """Hash of a file content, or None if it does not exist."""
+    try:
+        with open(path, "rb") as file:
+            return hashlib.sha256(file.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def load_manifest() -> dict:
+    try:
+        with open(MANIFEST, encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest: dict):
+    with open(MANIFEST, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=4, sort_keys=True)
+
+
+def walk(location: str, ext: str):
+    """Yield the directory and name of files with extension, skipping build folders."""
+    for directory, _, files in os.walk(location):
         if (
             ".ipynb_checkpoints" in directory
             or "_build" in directory
@@ -19,58 +50,120 @@ def update_files(ext):
             continue
 
         for file in files:
-            head, tail = file.split(".")
-            if not file.endswith(CONVERT[ext]) or "__init__" in file:
+            if not file.endswith(ext) or "__init__" in file:
                 continue
 
-            outfile = f"{head}.{ext}"
-            os.system(
-                f"jupytext --output {os.path.join(directory, outfile)} {os.path.join(directory, file)}"
-            )
+            yield directory, file
 
 
-def update_forms():
+def stale(jobs: list, manifest: dict) -> list:
+    """
+    Select the conversions whose source or output changed since the last run.
 
-    os.makedirs("training", exist_ok=True)
+    :param jobs: Pairs of source and output paths.
+    :param manifest: Hashes of the sources and outputs of the last run.
+    """
+    return [
+        (source, output)
+        for source, output in jobs
+        if manifest.get(output) != {"source": sha256(source), "output": sha256(output)}
+    ]
 
-    for directory, _, files in os.walk(os.path.join(LOCATION["py"])):
-        if (
-            ".ipynb_checkpoints" in directory
-            or "_build" in directory
-            or "__pycache__" in directory
-        ):
-            continue
 
-        for file in files:
+def write_notebook(notebook, output: str):
+    """
+    Write a notebook with the jupytext API.
 
-            if not file.endswith("py") or "__init__" in file:
-                continue
+    Existing notebooks are updated, preserving their cell outputs and ids.
+    """
+    import jupytext
+    from jupytext.combine import combine_inputs_with_outputs
+
+    if output.endswith(".ipynb") and os.path.isfile(output):
+        notebook = combine_inputs_with_outputs(notebook, jupytext.read(output))
+
+    print(f"[jupytext] Writing {output}")
+    jupytext.write(notebook, output)
+
+
+def convert(source: str, output: str):
+    """Convert a notebook between formats."""
+    import jupytext
+
+    write_notebook(jupytext.read(source), output)
+
+
+def run_conversions(jobs: list, converter=convert):
+    """
+    Run the stale conversions on a pool of processes and update the manifest.
+
+    :param jobs: Pairs of source and output paths.
+    :param converter: Function converting a source to an output, defined at module
+        level to be sent to the processes.
+    """
+    manifest = load_manifest()
+    jobs = stale(jobs, manifest)
+
+    if jobs:
+        with ProcessPoolExecutor() as pool:
+            list(pool.map(converter, *zip(*jobs)))
+
+    for source, output in jobs:
+        manifest[output] = {"source": sha256(source), "output": sha256(output)}
+
+    save_manifest(manifest)
+
+
+def update_files(ext):
+    jobs = []
+    for directory, file in walk(LOCATION[CONVERT[ext]], CONVERT[ext]):
+        head, tail = file.split(".")
+        outfile = f"{head}.{ext}"
+        jobs.append((os.path.join(directory, file), os.path.join(directory, outfile)))
+
+    run_conversions(jobs)
+
+
+def clear_form_cells(lines):
+    """
+    Yield the lines of a light-format script, with the 'clear-form' cells emptied.
+
+    A cell is cleared from its '# +' marker tagged with 'clear-form' to its closing
+    '# -' marker, both included, and replaced by an empty line.
+    """
+    skip = False
+    for line in lines:
+        if line.startswith("# +") and "clear-form" in line:
+            skip = True
+        elif skip and line.rstrip() == "# -":
+            skip = False
+            yield "\n"
+        elif not skip:
+            yield line
+
+
+def clear_form(source: str, output: str):
+    """Convert a py file to a notebook with the code of 'clear-form' cells removed."""
+    import jupytext
+
+    with open(source, encoding="utf-8") as orig:
+        text = "".join(clear_form_cells(orig))
+
+    write_notebook(jupytext.reads(text, fmt="py:light"), output)
+
+
+def update_forms():
+
+    os.makedirs("training", exist_ok=True)
+
+    jobs = []
+    for directory, file in walk(LOCATION["py"], "py"):
+        head, tail = file.split(".")
+        jobs.append(
+            (os.path.join(directory, file), os.path.join("training", f"{head}.ipynb"))
+        )
 
-            head, tail = file.split(".")
-            new_file = os.path.join("training", f"{head}.py")
-
-            with open(os.path.join(directory, file)) as orig:
-                lines = list(orig)
-                skip = False
-                with open(new_file, mode="w+") as new:
-                    for line in lines:
-                        if "clear-form" in line:
-                            skip = True
-
-                        # if line[0] in ["#", "\n"]:
-                        if "# -" in line and skip:
-                            skip = False
-                            new.write("\n")
-                            continue
-
-                        if not skip:
-                            new.write(line)
-
-            outfile = f"{head}.ipynb"
-            os.system(
-                f"jupytext --output {os.path.join('training', outfile)} {new_file}"
-            )
-            os.remove(new_file)
+    run_conversions(jobs, converter=clear_form)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+import hashlib
+import sys
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "devtools"))
+
+import add_url_tag_sha256  # pylint: disable=wrong-import-position
+
+
+@pytest.fixture
+def archive_server(tmp_path):
+    """Local HTTP stand-in serving tag archives, counting the requests."""
+    folder = tmp_path / "archive" / "refs" / "tags"
+    folder.mkdir(parents=True)
+    archives = {}
+    for name, size in [("v0.1.0.tar.gz", 3_000_000), ("v0.2.0.tar.gz", 10)]:
+        content = bytes(range(256)) * (size // 256) + b"end"
+        (folder / name).write_bytes(content)
+        archives[name] = hashlib.sha256(content).hexdigest()
+
+    requests = []
+
+    class Handler(SimpleHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            super().do_GET()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), partial(Handler, directory=str(tmp_path))
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    url = f"http://127.0.0.1:{server.server_address[1]}/archive/refs/tags"
+    yield url, archives, requests
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_compute_sha256(archive_server):
+    url, archives, requests = archive_server
+    cache = {}
+
+    for name, sha in archives.items():
+        assert add_url_tag_sha256.computeSha256(f"{url}/{name}", cache=cache) == sha
+
+    assert add_url_tag_sha256.computeSha256(f"{url}/v0.1.0.tar.gz", cache=cache)
+    assert len(requests) == 2
+
+
+def test_patch_pyproject(archive_server, tmp_path, monkeypatch):
+    url, archives, requests = archive_server
+    monkeypatch.chdir(tmp_path)
+    pyproject = tmp_path / "pyproject.toml"
+    pyproject.write_text(
+        "[tool.poetry.dependencies]\n"
+        'python = "^3.9"\n'
+        f'pkg_a = {{url = "{url}/v0.1.0.tar.gz#sha256=", optional = true}}\n'
+        f'pkg_b = {{url = "{url}/v0.2.0.tar.gz#sha256=abc"}}\n',
+        encoding="utf-8",
+    )
+
+    for _ in range(2):
+        add_url_tag_sha256.patchPyprojectToml()
+        lines = pyproject.read_text(encoding="utf-8").splitlines()
+
+        assert lines[1] == 'python = "^3.9"'
+        assert (
+            f'v0.1.0.tar.gz#sha256={archives["v0.1.0.tar.gz"]}", optional' in lines[2]
+        )
+        assert f'v0.2.0.tar.gz#sha256={archives["v0.2.0.tar.gz"]}"}}' in lines[3]
+
+    # The second patch is served from the local cache
+    assert len(requests) == 2
+
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
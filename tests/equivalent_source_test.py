@@ -0,0 +1,99 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "assets"))
+
+# pylint: disable=wrong-import-position
+from equivalent_source import EquivalentSources, source_layer
+from mag_dipole_app import dipole_fields, inclination_declination_2_xyz, tmi_projection
+
+EARTH_FIELD = (62.0, 15.0)
+
+
+def observations(seed: int, count: int = 400) -> np.ndarray:
+    """Scattered observation locations over a 1 km square."""
+    rng = np.random.default_rng(seed)
+
+    return np.c_[rng.uniform(0.0, 1000.0, (count, 2)), rng.uniform(0.0, 20.0, count)]
+
+
+def synthetic_tmi(locations: np.ndarray) -> np.ndarray:
+    """TMI of a few buried dipoles magnetized by induction, shape(n,)."""
+    rng = np.random.default_rng(0)
+    dipoles = np.c_[rng.uniform(300.0, 700.0, (6, 2)), rng.uniform(-250, -150, 6)]
+    moments = rng.uniform(1e6, 1e7, (6, 1)) * inclination_declination_2_xyz(
+        *EARTH_FIELD
+    )
+
+    return tmi_projection(dipole_fields(dipoles, locations, moments), EARTH_FIELD)[0]
+
+
+def test_kernel_matches_dipole_fields():
+    rng = np.random.default_rng(1)
+    locations = observations(0)
+    model = EquivalentSources(
+        source_layer(locations, 100.0, 50.0), *EARTH_FIELD, block_size=1000
+    )
+    moments = rng.uniform(-1e6, 1e6, model.sources.shape[0])
+
+    vectors = moments[:, None] * inclination_declination_2_xyz(*EARTH_FIELD)
+    expected = tmi_projection(
+        dipole_fields(model.sources, locations, vectors), EARTH_FIELD
+    )
+
+    np.testing.assert_allclose(
+        model.forward(locations, moments), expected[0], rtol=1e-10
+    )
+
+
+def test_adjoint():
+    rng = np.random.default_rng(2)
+    locations = observations(0)
+    model = EquivalentSources(
+        source_layer(locations, 100.0, 50.0), *EARTH_FIELD, block_size=1000
+    )
+    moments = rng.standard_normal(model.sources.shape[0])
+    values = rng.standard_normal(locations.shape[0])
+
+    np.testing.assert_allclose(
+        model.forward(locations, moments) @ values,
+        moments @ model.adjoint(locations, values),
+        rtol=1e-10,
+    )
+
+
+def test_cached_and_streamed_blocks():
+    locations = observations(0)
+    tmi = synthetic_tmi(locations)
+    sources = source_layer(locations, 100.0, 50.0)
+
+    cached = EquivalentSources(sources, *EARTH_FIELD, block_size=1000)
+    streamed = EquivalentSources(sources, *EARTH_FIELD, block_size=1000, cache_size=0)
+
+    iterations = cached.fit(locations, tmi, damping=1e-6, max_iterations=20)
+
+    assert streamed.fit(locations, tmi, damping=1e-6, max_iterations=20) == iterations
+    np.testing.assert_allclose(cached.moments, streamed.moments, rtol=1e-10)
+
+
+def test_fit_synthetic_tmi():
+    """CGLS reproduces the TMI of buried dipoles, at and between observations."""
+    locations = observations(0)
+    tmi = synthetic_tmi(locations)
+    model = EquivalentSources(source_layer(locations, 50.0, 200.0), *EARTH_FIELD)
+
+    model.fit(locations, tmi, max_iterations=500, tolerance=1e-6)
+
+    def misfit(targets):
+        expected = synthetic_tmi(targets)
+        return np.linalg.norm(model.predict(targets) - expected) / np.linalg.norm(
+            expected
+        )
+
+    assert misfit(locations) < 1e-2
+    assert misfit(observations(3, 100)) < 5e-2
+
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
@@ -0,0 +1,43 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "devtools"))
+
+# pylint: disable=wrong-import-position
+from execute_notebooks import assets_hash, group_notebooks
+
+
+def test_group_notebooks():
+    geoh5, ui_json, tif = Path("suncity.geoh5"), Path("app.ui.json"), Path("dem.tif")
+
+    groups = group_notebooks(
+        {
+            Path("a.ipynb"): [geoh5],
+            Path("b.ipynb"): [],
+            Path("c.ipynb"): [ui_json],
+            Path("d.ipynb"): [ui_json, geoh5],
+            Path("e.ipynb"): [tif],
+        }
+    )
+
+    assert sorted(groups) == [
+        [Path("a.ipynb"), Path("c.ipynb"), Path("d.ipynb")],
+        [Path("b.ipynb")],
+        [Path("e.ipynb")],
+    ]
+
+
+def test_assets_hash(tmp_path):
+    asset = tmp_path / "suncity.geoh5"
+    missing = assets_hash([asset])
+
+    asset.write_bytes(b"abc")
+    original = assets_hash([asset])
+    assert original != missing
+    assert assets_hash([asset]) == original
+
+    asset.write_bytes(b"abd")
+    assert assets_hash([asset]) != original
+
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
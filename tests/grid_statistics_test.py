@@ -0,0 +1,61 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+from geoh5py.objects import Points
+from geoh5py.workspace import Workspace
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "assets"))
+
+# pylint: disable=wrong-import-position
+from grid_statistics import StreamingStatistics, anomalous_cells, data_statistics
+
+
+def test_streaming_statistics_merge():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=10000)
+    values[::7] = np.nan
+
+    merged = StreamingStatistics(bins=256).update(values[:3000])
+    merged.merge(StreamingStatistics(bins=256).update(values[3000:] * 1.0))
+
+    assert merged.count == np.isfinite(values).sum()
+    np.testing.assert_allclose(merged.mean, np.nanmean(values))
+    np.testing.assert_allclose(merged.std, np.nanstd(values))
+    assert (merged.min, merged.max) == (np.nanmin(values), np.nanmax(values))
+
+
+def test_data_statistics(tmp_path):
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(size=5000)
+    values[rng.choice(5000, 250, replace=False)] = np.nan
+
+    with Workspace(str(tmp_path / "statistics.geoh5")) as workspace:
+        points = Points.create(workspace, vertices=rng.normal(size=(5000, 3)))
+        data = points.add_data({"tmi": {"values": values}})
+
+    workspace = Workspace(str(tmp_path / "statistics.geoh5"), mode="r")
+    data = workspace.get_entity("tmi")[0]
+    percentiles = np.r_[1, 25, 50, 75, 99]
+
+    # Through the handle of the open workspace, then from the closed file
+    for _ in range(2):
+        statistics = data_statistics(data, chunk_size=1000, bins=1024)
+
+        assert statistics.count == np.isfinite(values).sum()
+        np.testing.assert_allclose(statistics.mean, np.nanmean(values))
+        np.testing.assert_allclose(statistics.std, np.nanstd(values))
+        np.testing.assert_allclose(
+            statistics.percentile(percentiles),
+            # Histogram percentiles are bounded by the values of the ranks
+            np.nanpercentile(values, percentiles, method="inverted_cdf"),
+            atol=statistics.width,
+        )
+
+        cells = np.concatenate(list(anomalous_cells(data, 2.0, chunk_size=1000)))
+        np.testing.assert_array_equal(cells, np.flatnonzero(values > 2.0))
+
+        workspace.close()
+
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
@@ -0,0 +1,85 @@
+import stat
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "devtools"))
+
+# pylint: disable=wrong-import-position
+from create_geoapps_env_files import add_geoapps
+from lock_file_patcher import Append, MoveAfter, Substitute, patch_lock_file
+from run_conda_lock import none_md5_rule
+
+LOCK_FILE = """name: test
+dependencies:
+  - numpy=1.22.4 --hash=md5:None
+  - pip:
+    - pip-package @ https://host/pip-package.tar.gz
+    - geoh5py @ https://host/geoh5py.tar.gz#sha256=abc --hash=md5:None
+    - simpeg @ https://host/simpeg.tar.gz
+  - scipy=1.8.1
+"""
+
+
+def test_substitute_and_append(tmp_path):
+    lock_file = tmp_path / "env.lock.yml"
+    lock_file.write_text(LOCK_FILE)
+
+    patch_lock_file(lock_file, [none_md5_rule(), Append("\nvariables:\n")])
+
+    lines = lock_file.read_text().splitlines()
+    assert "md5:None" not in "".join(lines)
+    assert lines[2] == "  - numpy=1.22.4"
+    assert lines[-2:] == ["", "variables:"]
+    assert list(tmp_path.iterdir()) == [lock_file]
+
+
+def test_keep_permissions(tmp_path):
+    lock_file = tmp_path / "env.lock.yml"
+    output_file = tmp_path / "output.lock.yml"
+    lock_file.write_text(LOCK_FILE)
+    lock_file.chmod(0o644)
+
+    patch_lock_file(lock_file, [none_md5_rule()])
+    patch_lock_file(lock_file, [none_md5_rule()], output_file)
+
+    assert stat.S_IMODE(lock_file.stat().st_mode) == 0o644
+    assert stat.S_IMODE(output_file.stat().st_mode) == 0o644
+
+
+def test_add_geoapps(tmp_path):
+    lock_file = tmp_path / "env.lock.yml"
+    output_file = tmp_path / "output.lock.yml"
+    lock_file.write_text(LOCK_FILE)
+
+    add_geoapps("https://host/geoapps.tar.gz", lock_file, output_file)
+
+    assert lock_file.read_text() == LOCK_FILE
+    assert output_file.read_text().splitlines()[3:] == [
+        "  - pip:",
+        "    - geoh5py @ https://host/geoh5py.tar.gz#sha256=abc --hash=md5:None",
+        "    - simpeg @ https://host/simpeg.tar.gz",
+        "    - geoapps @ https://host/geoapps.tar.gz",
+        "    - pip-package @ https://host/pip-package.tar.gz",
+        "  - scipy=1.8.1",
+    ]
+
+
+def test_rules_chain(tmp_path):
+    lock_file = tmp_path / "env.lock.yml"
+    lock_file.write_text(LOCK_FILE)
+
+    patch_lock_file(
+        lock_file,
+        [
+            MoveAfter(r"^\s*- geoh5py @", r"^\s*- pip:"),
+            Substitute(r"geoh5py", "geoh5"),
+            none_md5_rule(),
+        ],
+    )
+
+    assert lock_file.read_text().splitlines()[4] == (
+        "    - geoh5 @ https://host/geoh5.tar.gz#sha256=abc"
+    )
+
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
@@ -0,0 +1,291 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from geoh5py.objects import Grid2D, Points
+from geoh5py.workspace import Workspace
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "assets"))
+
+# pylint: disable=wrong-import-position
+import mag_dipole_app
+from mag_dipole_app import (
+    FUSED_FIELDS,
+    b_field,
+    dipole_fields,
+    grid_tiles,
+    inclination_declination_2_xyz,
+    magnetic_simulator,
+    run,
+    tmi_projection,
+)
+
+ASSETS = Path(__file__).resolve().parents[1] / "assets"
+
+
+def central_differences(function, locations, step=1e-3):
+    """Derivatives of the components of a field, shape(n, 3, 3), along x, y and z."""
+    return np.stack(
+        [
+            (function(locations + step * axis) - function(locations - step * axis))
+            / (2 * step)
+            for axis in np.eye(3)
+        ],
+        axis=2,
+    )
+
+
+def test_b_field_gradient():
+    rng = np.random.default_rng(0)
+    locations = rng.uniform(-100.0, 100.0, (50, 3))
+    source = np.r_[3.0, -5.0, -60.0]
+
+    fields, tensor = b_field(source, locations, 1e5, 35.0, -20.0, gradient=True)
+    expected = central_differences(
+        lambda points: b_field(source, points, 1e5, 35.0, -20.0), locations
+    )
+
+    np.testing.assert_allclose(fields, b_field(source, locations, 1e5, 35.0, -20.0))
+    np.testing.assert_allclose(tensor, expected, atol=1e-6 * np.abs(tensor).max())
+    np.testing.assert_allclose(tensor, tensor.transpose(0, 2, 1), atol=1e-12)
+    np.testing.assert_allclose(np.trace(tensor, axis1=1, axis2=2), 0.0, atol=1e-12)
+
+
+def test_dipole_fields_gradient():
+    rng = np.random.default_rng(1)
+    sources = np.c_[rng.uniform(-50.0, 50.0, (20, 2)), rng.uniform(-90, -30, 20)]
+    locations = rng.uniform(-100.0, 100.0, (40, 3))
+    moments = rng.normal(size=(20, 3)) * 1e5
+
+    fields, tensor = dipole_fields(
+        sources, locations, moments, gradient=True, block_size=100
+    )
+    expected = central_differences(
+        lambda points: dipole_fields(sources, points, moments), locations
+    )
+
+    np.testing.assert_allclose(fields, dipole_fields(sources, locations, moments))
+    np.testing.assert_allclose(tensor, expected, atol=1e-6 * np.abs(tensor).max())
+
+
+def test_magnetic_simulator_gradients(tmp_path):
+    rng = np.random.default_rng(2)
+    sources = np.c_[rng.uniform(-50.0, 50.0, (5, 2)), rng.uniform(-90, -30, 5)]
+    locations = rng.uniform(-100.0, 100.0, (30, 3))
+
+    with Workspace(str(tmp_path / "gradients.geoh5")) as workspace:
+        data = magnetic_simulator(
+            Points.create(workspace, vertices=sources),
+            Points.create(workspace, vertices=locations),
+            1e5,
+            45.0,
+            10.0,
+            60.0,
+            -15.0,
+            gradients=True,
+        )
+        outputs = {entity.name: entity.values for entity in data}
+
+    moments = 1e5 * inclination_declination_2_xyz(45.0, 10.0).repeat(5, axis=0)
+    expected = central_differences(
+        lambda points: tmi_projection(
+            dipole_fields(sources, points, moments), (60.0, -15.0)
+        ).T,
+        locations,
+    )[:, 0, :]
+
+    assert {"b_xx", "b_xy", "b_xz", "b_yy", "b_yz", "b_zz"} <= set(outputs)
+    np.testing.assert_allclose(
+        outputs["b_xx"] + outputs["b_yy"] + outputs["b_zz"],
+        0.0,
+        atol=1e-9 * np.abs(outputs["b_zz"]).max(),
+    )
+    np.testing.assert_allclose(
+        outputs["analytic_signal"],
+        np.linalg.norm(expected, axis=1),
+        rtol=1e-5,
+    )
+
+
+def test_earth_field_per_receiver(tmp_path):
+    """Run from the ui.json, with a constant inclination and cell declinations."""
+    rng = np.random.default_rng(3)
+    sources = np.c_[rng.uniform(0.0, 100.0, (5, 2)), rng.uniform(-90, -30, 5)]
+
+    with Workspace(str(tmp_path / "earth_field.geoh5")) as workspace:
+        points = Points.create(workspace, vertices=sources)
+        grid = Grid2D.create(
+            workspace,
+            origin=np.rec.fromrecords([(0.0, 0.0, 10.0)], names="x, y, z")[0],
+            u_count=6,
+            v_count=4,
+            u_cell_size=20.0,
+            v_cell_size=25.0,
+        )
+        declination = grid.add_data(
+            {"declination": {"values": np.linspace(-30.0, 30.0, 24)}}
+        )
+
+    with open(ASSETS / "magnetic_dipole.ui.json", encoding="utf-8") as file:
+        ui_json = json.load(file)
+
+    ui_json["geoh5"] = str(tmp_path / "earth_field.geoh5")
+    ui_json["sources"]["value"] = f"{{{points.uid}}}"
+    ui_json["receivers"]["value"] = f"{{{grid.uid}}}"
+    ui_json["moments"]["value"] = 1e5
+    ui_json["earth_dec"].update(isValue=False, property=f"{{{declination.uid}}}")
+
+    with open(tmp_path / "earth_field.ui.json", "w", encoding="utf-8") as file:
+        json.dump(ui_json, file)
+
+    tmi = [
+        entity.values
+        for entity in run(str(tmp_path / "earth_field.ui.json"))
+        if entity.name == "tmi"
+    ][0]
+
+    moments = 1e5 * inclination_declination_2_xyz(-62.11, -17.9).repeat(5, axis=0)
+    fields = dipole_fields(sources, grid.centroids, moments)
+    earth_field = inclination_declination_2_xyz(-62.11, np.linspace(-30.0, 30.0, 24))
+
+    np.testing.assert_allclose(tmi, np.sum(fields * earth_field, axis=1), rtol=1e-6)
+
+
+def test_induced_moments_across_north(tmp_path):
+    rng = np.random.default_rng(4)
+    sources = np.c_[rng.uniform(-50.0, 50.0, (5, 2)), rng.uniform(-90, -30, 5)]
+    locations = rng.uniform(-100.0, 100.0, (20, 3))
+    susceptibility = rng.uniform(0.0, 0.1, 5)
+
+    with Workspace(str(tmp_path / "induced.geoh5")) as workspace:
+        points = Points.create(workspace, vertices=sources)
+        receivers = Points.create(workspace, vertices=locations)
+        data = magnetic_simulator(
+            points,
+            receivers,
+            1.0,
+            0.0,
+            0.0,
+            60.0,
+            # Declinations on either side of North
+            receivers.add_data({"dec": {"values": np.tile([359.0, 1.0], 10)}}),
+            susceptibilities=points.add_data({"chi": {"values": susceptibility}}),
+            volumes=1e3,
+        )
+        b_z = [entity.values for entity in data if entity.name == "b_z"][0]
+
+    # Pointing North, slightly steeper than the field on the receivers
+    direction = inclination_declination_2_xyz(60.0, [359.0, 1.0]).mean(axis=0)
+    direction /= np.linalg.norm(direction)
+    moments = susceptibility[:, None] * 1e3 * 50000.0 * 1e-9 / (4e-7 * np.pi)
+
+    np.testing.assert_allclose(direction[0], 0.0, atol=1e-12)
+    np.testing.assert_allclose(
+        b_z, dipole_fields(sources, locations, moments * direction)[:, 2], rtol=1e-6
+    )
+
+
+@pytest.mark.parametrize("order", ["morton", "hilbert"])
+def test_space_filling_order(tmp_path, order):
+    """Outputs sorted along a curve come back in the order of the receivers."""
+    rng = np.random.default_rng(6)
+    sources = np.c_[rng.uniform(0.0, 100.0, (30, 2)), rng.uniform(-90, -30, 30)]
+    locations = np.c_[rng.uniform(0.0, 100.0, (200, 2)), np.zeros(200)]
+
+    outputs = []
+    with Workspace(str(tmp_path / "order.geoh5")) as workspace:
+        points = Points.create(workspace, vertices=sources)
+        moments = points.add_data({"moments": {"values": rng.uniform(1e4, 1e5, 30)}})
+        receivers = [Points.create(workspace, vertices=locations) for _ in range(2)]
+        # Earth's field varying between receivers, in the original order
+        declination = receivers[0].add_data(
+            {"dec": {"values": rng.uniform(-20, 20, 200)}}
+        )
+
+        for entity, key in zip(receivers, [None, order]):
+            data = magnetic_simulator(
+                points,
+                entity,
+                moments,
+                45.0,
+                10.0,
+                60.0,
+                declination,
+                gradients=True,
+                order=key,
+            )
+            outputs.append({output.name: output.values for output in data})
+
+    assert list(outputs[1]) == list(outputs[0])
+    for name, values in outputs[0].items():
+        np.testing.assert_allclose(outputs[1][name], values, rtol=1e-10)
+
+
+def test_grid_tiles(tmp_path):
+    with Workspace(str(tmp_path / "tiles.geoh5")) as workspace:
+        for rotation, vertical in [(0.0, False), (37.5, False), (-120.0, True)]:
+            grid = Grid2D.create(
+                workspace,
+                origin=np.rec.fromrecords([(10.0, -20.0, 5.0)], names="x, y, z")[0],
+                u_count=9,
+                v_count=5,
+                u_cell_size=12.5,
+                v_cell_size=7.0,
+                rotation=rotation,
+                vertical=vertical,
+            )
+            tiles = list(grid_tiles(grid, tile_size=7))
+
+            assert [cells.start for cells, _ in tiles] == list(range(0, 45, 7))
+            np.testing.assert_allclose(
+                np.vstack([points for _, points in tiles]), grid.centroids
+            )
+
+
+@pytest.mark.parametrize("backend", list(FUSED_FIELDS))
+def test_fused_fields(backend, monkeypatch):
+    if backend == "numexpr":
+        pytest.importorskip("numexpr")
+
+    monkeypatch.setattr(mag_dipole_app, "KERNEL_BACKEND", backend)
+    rng = np.random.default_rng(5)
+    sources = np.c_[rng.uniform(0.0, 500.0, (30, 2)), rng.uniform(-90, -30, 30)]
+    locations = np.c_[rng.uniform(0.0, 500.0, (200, 2)), np.zeros(200)]
+    moments = rng.normal(size=(30, 3)) * 1e5
+
+    # Terms of b_field, one dipole at a time
+    expected = np.zeros_like(locations)
+    for source, moment in zip(sources, moments):
+        rad = source - locations
+        dist = np.linalg.norm(rad, axis=1)[:, None]
+        m_dot_r = rad @ moment
+        expected += 100 * (3 * m_dot_r[:, None] * rad / dist**5 - moment / dist**3)
+
+    # Blocks of a few dipoles, with a smaller last block
+    fields = dipole_fields(sources, locations, moments, block_size=1400)
+
+    np.testing.assert_allclose(fields, expected, atol=1e-13 * np.abs(expected).max())
+    np.testing.assert_allclose(
+        fields, dipole_fields(sources, locations, moments, gradient=True)[0]
+    )
+
+
+def test_kernel_backend_validation():
+    process = subprocess.run(
+        [sys.executable, "-c", "import mag_dipole_app"],
+        cwd=ASSETS,
+        env={**os.environ, "MAG_DIPOLE_KERNEL": "fortran"},
+        capture_output=True,
+        check=False,
+        text=True,
+    )
+
+    assert process.returncode != 0
+    assert "MAG_DIPOLE_KERNEL should be one of" in process.stderr
+
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
@@ -0,0 +1,120 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+from geoh5py.objects import Points
+from geoh5py.workspace import Workspace
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "assets"))
+
+# pylint: disable=wrong-import-position
+from mag_dipole_app import dipole_fields, inclination_declination_2_xyz
+from mag_dipole_batch import find_jobs, group_jobs, run_batch
+
+ASSETS = Path(__file__).resolve().parents[1] / "assets"
+
+
+def write_job(file: Path, geoh5: str, sources: str = "", receivers: str = ""):
+    """Write a minimal ui.json for grouping."""
+    with open(file, "w", encoding="utf-8") as output:
+        json.dump(
+            {
+                "geoh5": geoh5,
+                "sources": {"value": sources},
+                "receivers": {"value": receivers},
+            },
+            output,
+        )
+
+
+def test_find_jobs(tmp_path, monkeypatch):
+    for name in ["b.ui.json", "a.ui.json", "notes.json"]:
+        (tmp_path / name).touch()
+    monkeypatch.chdir(tmp_path.parent)
+
+    assert find_jobs([tmp_path.name, f"{tmp_path.name}/a*.ui.json"]) == [
+        str(tmp_path / "a.ui.json"),
+        str(tmp_path / "b.ui.json"),
+    ]
+    assert not find_jobs([str(tmp_path / "missing")])
+
+
+def test_group_jobs(tmp_path, monkeypatch):
+    (tmp_path / "other").mkdir()
+    write_job(tmp_path / "c.ui.json", "survey.geoh5", "{2}", "{1}")
+    write_job(tmp_path / "a.ui.json", str(tmp_path / "survey.geoh5"), "{1}", "{2}")
+    write_job(tmp_path / "b.ui.json", "./survey.geoh5", "{1}", "{1}")
+    write_job(tmp_path / "other" / "d.ui.json", "survey.geoh5", "{1}", "{1}")
+    monkeypatch.chdir(tmp_path / "other")
+
+    groups = group_jobs(
+        [
+            str(tmp_path / name)
+            for name in ["a.ui.json", "b.ui.json", "c.ui.json", "other/d.ui.json"]
+        ]
+    )
+
+    # Relative paths are resolved against the directory of the ui.json
+    assert groups == {
+        str(tmp_path / "survey.geoh5"): [
+            str(tmp_path / "b.ui.json"),
+            str(tmp_path / "a.ui.json"),
+            str(tmp_path / "c.ui.json"),
+        ],
+        str(tmp_path / "other" / "survey.geoh5"): [
+            str(tmp_path / "other" / "d.ui.json")
+        ],
+    }
+
+
+def test_run_batch(tmp_path):
+    """Variants of one ui.json on a relative geoh5, computed on two processes."""
+    rng = np.random.default_rng(5)
+    sources = np.c_[rng.uniform(0.0, 100.0, (5, 2)), rng.uniform(-90, -30, 5)]
+    receivers = np.c_[rng.uniform(0.0, 100.0, (20, 2)), np.zeros(20)]
+
+    jobs = tmp_path / "jobs"
+    jobs.mkdir()
+    with Workspace(str(jobs / "batch.geoh5")) as workspace:
+        points = Points.create(workspace, vertices=sources, name="sources")
+        survey = Points.create(workspace, vertices=receivers, name="receivers")
+
+    with open(ASSETS / "magnetic_dipole.ui.json", encoding="utf-8") as file:
+        ui_json = json.load(file)
+
+    ui_json["geoh5"] = "batch.geoh5"
+    ui_json["sources"]["value"] = f"{{{points.uid}}}"
+    ui_json["receivers"]["value"] = f"{{{survey.uid}}}"
+    for index in range(6):
+        ui_json["moments"]["value"] = 1e5 * (index + 1)
+        with open(jobs / f"job_{index}.ui.json", "w", encoding="utf-8") as file:
+            json.dump(ui_json, file)
+
+    cwd = os.getcwd()
+    run_batch([str(jobs)], workers=2, summary_file=str(tmp_path / "summary.json"))
+    assert os.getcwd() == cwd
+
+    with open(tmp_path / "summary.json", encoding="utf-8") as file:
+        summary = json.load(file)
+
+    assert summary["jobs"] == 6 and summary["failed"] == 0
+
+    moments = 1e5 * inclination_declination_2_xyz(-62.11, -17.9).repeat(5, axis=0)
+    tmi = (
+        dipole_fields(sources, receivers, moments)
+        @ inclination_declination_2_xyz(-62.11, -17.9).ravel()
+    )
+
+    with Workspace(str(jobs / "batch.geoh5"), mode="r") as workspace:
+        outputs = [data.values for data in workspace.get_entity("tmi")]
+
+    np.testing.assert_allclose(
+        sorted(np.mean(values / tmi) for values in outputs),
+        np.arange(1, 7),
+        rtol=1e-6,
+    )
+
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
@@ -0,0 +1,43 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "assets"))
+
+# pylint: disable=wrong-import-position
+from mag_dipole_app import b_field
+from mag_dipole_lines import read_lines, simulate_lines, write_lines
+
+
+def test_read_lines(tmp_path):
+    survey = tmp_path / "survey.csv"
+    rows = [f"{line},{ind},{2 * ind},100" for line, ind in zip("AAAABBB", range(7))]
+    survey.write_text("\n".join(["Line,X,Y,Z"] + rows) + "\n")
+
+    # Line A fills exactly one chunk
+    lines = list(read_lines(str(survey), chunk_size=4))
+
+    assert [line for line, _ in lines] == ["A", "B"]
+    np.testing.assert_array_equal(lines[0][1], np.c_[0:4, 0:8:2, [100.0] * 4])
+    np.testing.assert_array_equal(lines[1][1], np.c_[4:7, 8:14:2, [100.0] * 3])
+
+
+def test_simulate_lines(tmp_path):
+    locations = np.c_[np.arange(10.0), np.zeros(10), np.zeros(10)]
+    dipoles = np.array(
+        [[2.0, 0.0, -50.0, 1e5, 45.0, 0.0], [1e4, 0.0, -50.0, 1e5, 45.0, 0.0]]
+    )
+
+    results = list(simulate_lines([("A", locations)], dipoles, 60.0, 0.0, 100.0))
+    everything = list(simulate_lines([("A", locations)], dipoles[:1], 60.0, 0.0))
+
+    # The far dipole is outside the radius
+    np.testing.assert_allclose(results[0][2], everything[0][2])
+    np.testing.assert_allclose(
+        results[0][2][:, :3], b_field(dipoles[0, :3], locations, 1e5, 45.0, 0.0)
+    )
+    assert write_lines(str(tmp_path / "output.csv"), results) == 10
+
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
@@ -0,0 +1,64 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "assets"))
+
+# pylint: disable=wrong-import-position
+from mag_dipole_server import GeometryCache, module_stamps, reload_modules
+
+
+def test_reload_modules(tmp_path, monkeypatch):
+    module = tmp_path / "reloaded_app.py"
+    module.write_text("VALUE = 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    import reloaded_app  # pylint: disable=import-outside-toplevel,import-error
+
+    try:
+        stamps = module_stamps(tmp_path.resolve())
+        assert list(stamps) == ["reloaded_app"]
+        assert not reload_modules(tmp_path.resolve(), stamps)
+
+        module.write_text("VALUE = 2\n")
+        os.utime(module, ns=(stamps["reloaded_app"] + 10**9,) * 2)
+
+        assert reload_modules(tmp_path.resolve(), stamps) == ["reloaded_app"]
+        assert reloaded_app.VALUE == 2
+        assert not reload_modules(tmp_path.resolve(), stamps)
+    finally:
+        del sys.modules["reloaded_app"]
+
+
+def test_geometry_cache(tmp_path, monkeypatch):
+    geoh5 = tmp_path / "geometry.geoh5"
+    geoh5.touch()
+    file = str(tmp_path / "geometry.ui.json")
+    with open(file, "w", encoding="utf-8") as ui_json:
+        json.dump({"geoh5": geoh5.name}, ui_json)
+    monkeypatch.chdir(tmp_path.parent)
+
+    def touch_later():
+        mtime = geoh5.stat().st_mtime_ns + 10**9
+        os.utime(geoh5, ns=(mtime, mtime))
+
+    cache = GeometryCache()
+    geometry = cache.get(file)
+    geometry["uid"] = "locations"
+    assert cache.get(file) is geometry
+
+    # Outputs written by a run of the worker
+    touch_later()
+    cache.update(file)
+    assert cache.get(file) is geometry
+
+    # Modified by another application
+    touch_later()
+    assert cache.get(file) == {}
+
+    geoh5.unlink()
+    assert cache.get(file) is None
+
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
@@ -1,30 +1,100 @@
+import multiprocessing
 import os
+import runpy
 import subprocess
+import sys
+from pathlib import Path
 
+import pytest
 
-def test_notebooks():
+CONTENT = Path(__file__).resolve().parents[1] / "content"
 
-    failures = []
-    for directory, _, files in os.walk(os.path.join("..", "content")):
+# Modules imported once by the warm interpreter and shared by all scripts
+PRELOAD = ["numpy", "matplotlib.pyplot", "geoh5py.workspace", "geoh5py.ui_json"]
+
+# Scripts writing to the same assets cannot run at the same time
+SHARED_ASSETS = ["suncity.geoh5", "magnetic_dipole.ui.json"]
+
+# Maximum time (s) to run a script
+TIMEOUT = 600
+
+
+def collect_scripts() -> list:
+    """List the scripts under content, grouped by the assets they write to."""
+    scripts = []
+    for directory, _, files in os.walk(CONTENT):
         if ".ipynb_checkpoints" in directory or "_build" in directory:
             continue
 
-        for file in files:
-
+        for file in sorted(files):
             if not file.endswith(".py"):
                 continue
 
-            process = subprocess.run(
-                ["python", os.path.join(directory, file)],
-                capture_output=True,
-                check=True,
+            script = Path(directory) / file
+            source = script.read_text(encoding="utf-8")
+            group = next(
+                (asset for asset in SHARED_ASSETS if asset in source), script.stem
+            )
+            scripts.append(
+                pytest.param(
+                    script,
+                    id=str(script.relative_to(CONTENT)),
+                    marks=pytest.mark.xdist_group(group),
+                )
             )
 
-            if not process.returncode == 0:
-                failures.append(process)
+    return scripts
+
+
+def execute(script: str, log: str):
+    """Run a script as __main__ from its own directory, with its output to a log."""
+    with open(log, "wb") as file:
+        os.dup2(file.fileno(), sys.stdout.fileno())
+        os.dup2(file.fileno(), sys.stderr.fileno())
+
+    os.chdir(os.path.dirname(script))
+    sys.argv = [script]
+    runpy.run_path(script, run_name="__main__")
+
+
+@pytest.fixture(scope="session")
+def interpreter():
+    """
+    Fork server with the heavy modules pre-imported, if available on the platform.
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return None
+
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(PRELOAD)
+
+    return context
+
+
+@pytest.mark.parametrize("script", collect_scripts())
+def test_notebooks(script, interpreter, tmp_path):
+    if interpreter is None:
+        process = subprocess.run(
+            [sys.executable, str(script)],
+            cwd=script.parent,
+            capture_output=True,
+            check=False,
+            timeout=TIMEOUT,
+        )
+        assert process.returncode == 0, process.stderr.decode()
+    else:
+        log = tmp_path / "output.log"
+        process = interpreter.Process(target=execute, args=(str(script), str(log)))
+        process.start()
+        process.join(TIMEOUT)
+
+        if process.is_alive():
+            process.kill()
+            process.join()
+            pytest.fail(f"{script.name} timed out after {TIMEOUT} s")
 
-        if any(failures):
-            raise RuntimeError(failures)
+        output = log.read_text(encoding="utf-8", errors="replace")
+        assert process.exitcode == 0, f"exited with {process.exitcode}\n{output}"
 
 
 #  Copyright (c) 2022 Mira Geoscience Ltd.
@@ -0,0 +1,94 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from geoh5py.objects import Grid2D
+from geoh5py.workspace import Workspace
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "assets"))
+
+# pylint: disable=wrong-import-position
+from mag_dipole_app import dipole_fields, inclination_declination_2_xyz, tmi_projection
+from potential_filters import (
+    filter_grid,
+    horizontal_derivative,
+    reduce_to_pole,
+    upward_continuation,
+    vertical_derivative,
+)
+
+EARTH_FIELD = (62.0, 15.0)
+HEIGHT = 20.0
+
+
+def dipole_tmi(locations, field=EARTH_FIELD):
+    """TMI of a dipole induced by a field, 100 m below the origin."""
+    moment = 1e8 * inclination_declination_2_xyz(*field)
+    fields = dipole_fields(np.array([[0.0, 0.0, -100.0]]), locations, moment)
+
+    return tmi_projection(fields, field)[0]
+
+
+def derivative(locations, axis, step=1e-2):
+    """Central difference of the dipole TMI along x, y or z."""
+    offset = step * np.eye(3)[axis]
+
+    return (dipole_tmi(locations + offset) - dipole_tmi(locations - offset)) / (
+        2 * step
+    )
+
+
+@pytest.mark.parametrize("rotation", [0.0, 30.0, -120.0])
+def test_filter_grid(tmp_path, rotation):
+    """Filters of the TMI of a dipole against its direct evaluation."""
+    angle = np.deg2rad(rotation)
+    u_count, v_count, u_cell_size, v_cell_size = 256, 300, 10.0, 8.0
+    # Centered on the dipole
+    center = np.r_[u_count * u_cell_size, v_count * v_cell_size] / 2
+    origin = (
+        -np.c_[[np.cos(angle), np.sin(angle)], [-np.sin(angle), np.cos(angle)]] @ center
+    )
+
+    with Workspace(str(tmp_path / "filters.geoh5")) as workspace:
+        grid = Grid2D.create(
+            workspace,
+            origin=np.rec.fromrecords([(*origin, 0.0)], names="x, y, z")[0],
+            u_count=u_count,
+            v_count=v_count,
+            u_cell_size=u_cell_size,
+            v_cell_size=v_cell_size,
+            rotation=rotation,
+        )
+        centroids = grid.centroids
+        expected = {
+            "upward": (dipole_tmi(centroids + [0, 0, HEIGHT]), 2e-4),
+            "d_z": (derivative(centroids, 2), 5e-4),
+            "d_x": (derivative(centroids, 0), 1e-2),
+            "d_y": (derivative(centroids, 1), 1e-2),
+            "upward_d_z": (derivative(centroids + [0, 0, HEIGHT], 2), 5e-4),
+            "rtp": (dipole_tmi(centroids, (90.0, 0.0)), 5e-3),
+        }
+
+        data = filter_grid(
+            grid,
+            dipole_tmi(centroids),
+            {
+                "upward": [upward_continuation(HEIGHT)],
+                "d_z": [vertical_derivative()],
+                "d_x": [horizontal_derivative("x")],
+                "d_y": [horizontal_derivative("y")],
+                "upward_d_z": [upward_continuation(HEIGHT), vertical_derivative()],
+                "rtp": [reduce_to_pole(*EARTH_FIELD)],
+            },
+        )
+
+        assert [entity.name for entity in data] == list(expected)
+        for entity in data:
+            values, tolerance = expected[entity.name]
+            np.testing.assert_allclose(
+                entity.values, values, atol=tolerance * np.abs(values).max()
+            )
+
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.
@@ -0,0 +1,122 @@
+import json
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from geoh5py.ui_json import InputFile
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "assets"))
+
+# pylint: disable=wrong-import-position
+from ui_json_cache import InputFileCache
+
+
+@pytest.fixture(name="calls")
+def fixture_calls(monkeypatch):
+    """Record the validation options of each InputFile read, without a workspace."""
+    calls = []
+
+    def read_ui_json(file, validation_options=None):
+        calls.append(validation_options)
+        return SimpleNamespace(data={"file": file, "read": len(calls)})
+
+    monkeypatch.setattr(InputFile, "read_ui_json", read_ui_json)
+
+    return calls
+
+
+def write_ui_json(folder: Path, geoh5: str = "cache.geoh5") -> str:
+    """Write a ui.json pointing to a geoh5 file relative to its folder."""
+    (folder / "cache.geoh5").touch()
+    file = folder / "cache.ui.json"
+    with open(file, "w", encoding="utf-8") as output:
+        json.dump({"title": "cache", "geoh5": geoh5}, output)
+
+    return str(file)
+
+
+def touch_later(file: Path):
+    """Move the modification time of a file forward by one second."""
+    mtime = file.stat().st_mtime_ns + 10**9
+    os.utime(file, ns=(mtime, mtime))
+
+
+def test_stamp_relative_geoh5(tmp_path, monkeypatch):
+    file = write_ui_json(tmp_path)
+    monkeypatch.chdir(tmp_path.parent)
+
+    assert (
+        InputFileCache.stamp(file)[1] == (tmp_path / "cache.geoh5").stat().st_mtime_ns
+    )
+
+    (tmp_path / "cache.geoh5").unlink()
+    assert InputFileCache.stamp(file)[1] is None
+
+
+def test_hit_in_process(tmp_path, calls):
+    file = write_ui_json(tmp_path)
+    cache = InputFileCache(tmp_path / "cache.json")
+
+    data = cache.read_ui_json(file)
+
+    assert cache.read_ui_json(file) is data
+    assert calls == [None]
+
+
+def test_hit_across_processes(tmp_path, calls):
+    file = write_ui_json(tmp_path)
+    InputFileCache(tmp_path / "cache.json").read_ui_json(file)
+
+    # A new process only shares the cache file
+    InputFileCache(tmp_path / "cache.json").read_ui_json(file)
+
+    assert calls == [None, {"disabled": True}]
+
+
+def test_miss_after_geoh5_change(tmp_path, calls):
+    file = write_ui_json(tmp_path)
+    cache = InputFileCache(tmp_path / "cache.json")
+    data = cache.read_ui_json(file)
+
+    touch_later(tmp_path / "cache.geoh5")
+
+    assert cache.read_ui_json(file) is not data
+    InputFileCache(tmp_path / "cache.json").read_ui_json(file)
+    assert calls == [None, None, {"disabled": True}]
+
+
+def test_missing_geoh5(tmp_path, calls):
+    file = write_ui_json(tmp_path, geoh5="missing.geoh5")
+    cache = InputFileCache(tmp_path / "cache.json")
+
+    cache.read_ui_json(file)
+    cache.read_ui_json(file)
+    cache.update(file)
+    InputFileCache(tmp_path / "cache.json").read_ui_json(file)
+
+    assert calls == [None, None, None]
+    assert not (tmp_path / "cache.json").exists()
+
+
+def test_update_after_run(tmp_path, calls):
+    file = write_ui_json(tmp_path)
+    cache = InputFileCache(tmp_path / "cache.json")
+    data = cache.read_ui_json(file)
+
+    # The run writes its outputs to the workspace
+    touch_later(tmp_path / "cache.geoh5")
+    cache.update(file)
+
+    assert cache.read_ui_json(file) is data
+    InputFileCache(tmp_path / "cache.json").read_ui_json(file)
+    assert calls == [None, {"disabled": True}]
+
+    with open(tmp_path / "cache.json", encoding="utf-8") as records:
+        assert list(json.load(records).values())[0]["mtime"] == (
+            (tmp_path / "cache.geoh5").stat().st_mtime_ns
+        )
+
+
+#  Copyright (c) 2022 Mira Geoscience Ltd.